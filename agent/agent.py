@@ -1,36 +1,49 @@
+import asyncio
 from dataclasses import dataclass
-import time
-import json
+from datetime import datetime
 from typing import Any, Literal, Optional
 import logging
+import os
+import tempfile
 
 from dotenv import load_dotenv
 from custom_types import (
     TaskName,
     TaskDescription,
-    TaskError,
-    TaskNotFoundError,
-    TaskAlreadyExistsError,
     FutureDatetime,
+    TaskEdit,
+    TaskFilter,
+    TaskSpec,
     Tools,
 )
 import db
-from utils import DateTimeEncoder
-from livekit import api
-from livekit.protocol.room import UpdateRoomMetadataRequest
+from buffered_writer import BufferedTextWriter
+from guest_reaper import guest_reaper
+from task_cache import TaskCache
 from livekit import agents
 from livekit.agents.types import NOT_GIVEN
 from livekit.agents import (
     AgentSession,
+    JobExecutorType,
     RoomInputOptions,
     RoomOutputOptions,
     function_tool,
     RunContext,
     get_job_context,
 )
-from livekit.plugins import openai, deepgram, silero, cartesia
-
+from livekit.plugins import openai, deepgram, cartesia
+
+from intents import IntentRouter
+from log_pipeline import set_log_fields
+from metadata_publisher import RoomMetadataPublisher
+from prompt_builder import task_table
+from reminders import reminders
+from replies import ToolReplies, reminder
+from resources import resources
+from task_actions import ActionResult, TaskActions
 from task_assistant import TaskAssistant
+from tracing import traced
+from utils import env_number
 
 from prompts import TASK_ASSISTANT_INSTRUCTIONS_TEMPLATE
 
@@ -38,12 +51,26 @@ load_dotenv(".env", verbose=True)
 
 logger = logging.getLogger("Agent")
 
-TOOL_NAMES = ["create_task", "edit_task", "delete_task", "invalid_request"]
+TOOL_NAMES = [
+    "create_task",
+    "edit_task",
+    "delete_task",
+    "create_tasks",
+    "edit_tasks",
+    "delete_tasks",
+    "query_tasks",
+    "invalid_request",
+]
+
+# The most tasks returned by one call of the 'query_tasks' tool.
+QUERY_TASKS_LIMIT = 25
 
 TOOL_INSTRUCTIONS = (
     "When the user requests to create, add, or make a new task you will use the 'create_task' function. "
     "When the user requests to edit, modify, or change a task in any way, you will use the 'edit_task' function. "
     "When the user requests to delete, remove, or clear a task you will use the 'delete_task' function. "
+    "When the user requests to create, edit, or delete more than one task at once you will use the 'create_tasks', 'edit_tasks', or 'delete_tasks' function (respectively) with all of the tasks in a single call. "
+    "When the user asks which of their tasks match some criteria (e.g. what is due this week, or what is not done yet), or about tasks that are not listed in these instructions, you will use the 'query_tasks' function. "
     "When the user requests anything unrelated to managing their tasks you will use the 'invalid_request' function. "
 )
 
@@ -55,58 +82,28 @@ task_assistant_instructions = TASK_ASSISTANT_INSTRUCTIONS_TEMPLATE.format(
 @dataclass
 class UserData:
     id: str
+    task_cache: TaskCache
 
 
 async def get_user_data(ctx: agents.JobContext):
     user_participant = await ctx.wait_for_participant()
-    return UserData(id=user_participant.identity)
-
-
-async def entrypoint(ctx: agents.JobContext):
-    await ctx.connect()
+    user_id = user_participant.identity
+    return UserData(id=user_id, task_cache=TaskCache(user_id))
 
-    lkapi = api.LiveKitAPI()
-    room_service = lkapi.room
 
-    await db.init_pool()
+def make_tools(
+    userdata: UserData, actions: TaskActions, tool_replies: Optional[ToolReplies]
+) -> Tools:
+    """Build the assistant's tools for the user's session."""
 
-    async def update_room_metadata(update_type: str, ctx: RunContext, **kwargs):
-        try:
-            assert ctx.session._room_io is not None, (
-                "Session does not have _room_io set!"
-            )
-            update = UpdateRoomMetadataRequest(
-                room=ctx.session._room_io._room.name,
-                metadata=json.dumps(
-                    {
-                        "update_type": update_type,
-                        "data": kwargs,
-                        "updated_at": time.time(),
-                    },
-                    cls=DateTimeEncoder,
-                ),
-            )
-            await room_service.update_room_metadata(update=update)
-        except TypeError as te:
-            logger.error(te)
-
-    userdata = await get_user_data(ctx)
-
-    ac = await db.getAgentConfig(userdata.id)
-
-    session = AgentSession[UserData](
-        stt=deepgram.STT(model=ac.stt_model, api_key=ac.stt_key, language="multi"),
-        llm=openai.LLM(
-            model=ac.llm_model, api_key=ac.llm_key, max_completion_tokens=2500
-        ),
-        tts=cartesia.TTS(model=ac.tts_model, api_key=ac.tts_key)
-        if ac.tts_key is not None and ac.tts_model is not None
-        else NOT_GIVEN,
-        vad=silero.VAD.load(),
-        userdata=userdata,
-    )
+    def record_results(
+        context: RunContext, action: str, results: list[ActionResult]
+    ) -> None:
+        if tool_replies is not None:
+            tool_replies.record(context.function_call.call_id, action, results)
 
     @function_tool()
+    @traced("tool.create_task")
     async def create_task(
         context: RunContext,
         name: TaskName,
@@ -121,35 +118,17 @@ async def entrypoint(ctx: agents.JobContext):
             deadline (FutureDatetime | None, optional): The deadline (i.e. due date) of the task. Must in a 24-hour time format. Defaults to None.
             description (TaskDescription | None, optional): An additional description of the task. Defaults to None.
         """
-        logger.info(f"The 'create_task' tool was called with name = ({name}).")
-        try:
-            user_id = context.session.userdata.id
-            result = await db.create_task(
-                user_id, name, is_complete, deadline, description
-            )
-
-            # TODO: Create another logger for agent messages
-            if isinstance(result, TaskAlreadyExistsError):
-                return f"Failed to create new a task with the name '{name.strip().lower()}'. A task with that name already exists."
-
-            if isinstance(result, TaskError):
-                return f"Failed to create new a task with the name '{name.strip().lower()}'. An unknown error occurred."
-
-            await update_room_metadata(
-                "CREATE",
-                context,
-                name=name,
-                is_complete=is_complete,
-                deadline=deadline,
-                description=description,
-            )
-
-            return f"Created a new task: '{name}'."
-
-        except Exception as ex:
-            raise ex
+        logger.info(
+            "The 'create_task' tool was called with name = (%s).",
+            name,
+            extra={"tool": "create_task"},
+        )
+        result = await actions.create_task(name, is_complete, deadline, description)
+        record_results(context, "create", [result])
+        return result.message
 
     @function_tool()
+    @traced("tool.edit_task")
     async def edit_task(
         context: RunContext,
         name: TaskName,
@@ -168,79 +147,250 @@ async def entrypoint(ctx: agents.JobContext):
             new_description (TaskDescription | None): The new description of the task. Pass an empty string to remove the description. Pass None to forgo updating it.
 
         """
-        logger.info(f"The edit_task tool was called with name = ({name})")
-        user_id = context.session.userdata.id
-        try:
-            updated_fields: dict[str, Any] = {}
-            if new_name is not None:
-                updated_fields["name"] = new_name
-            if is_complete is not None:
-                updated_fields["is_complete"] = is_complete
-            if new_deadline != "No Update":
-                updated_fields["deadline"] = new_deadline
-            if new_description is not None:
-                updated_fields["description"] = new_description
-
-            updated_task = await db.edit_task(user_id, name, updated_fields)
-
-            if isinstance(updated_task, ValueError):
-                return f"The task with the name '{name}' could not be edited. No fields were specified to be updated."
-
-            if isinstance(updated_task, TaskError):
-                return f"The task with the name '{name}' could not be edited. An unknown error occured."
-
-            if isinstance(updated_task, TaskNotFoundError):
-                return f"The task with the name '{name}' was not edited. Either the task could not be found, or the field(s) {"'" + "', '".join([k for k in updated_fields.keys()]) + "'"} did not need to be updated."
-
-            await update_room_metadata(
-                "EDIT", context, initial_name=name, task=updated_task.model_dump()
-            )
-
-            return f"Edited the task: '{name}'."
-        except Exception as ex:
-            logger.error("Error while editing task, %s.", ex)
-            return "An unknown error occurred."
+        logger.info(
+            "The edit_task tool was called with name = (%s)",
+            name,
+            extra={"tool": "edit_task"},
+        )
+        updated_fields: dict[str, Any] = {}
+        if new_name is not None:
+            updated_fields["name"] = new_name
+        if is_complete is not None:
+            updated_fields["is_complete"] = is_complete
+        if new_deadline != "No Update":
+            updated_fields["deadline"] = new_deadline
+        if new_description is not None:
+            updated_fields["description"] = new_description
+
+        result = await actions.edit_task(name, updated_fields)
+        if updated_fields.keys() == {"is_complete"}:
+            action = "complete" if updated_fields["is_complete"] else "uncomplete"
+        else:
+            action = "edit"
+        record_results(context, action, [result])
+        return result.message
 
     @function_tool()
+    @traced("tool.delete_task")
     async def delete_task(context: RunContext, name: TaskName) -> str:
         """Delete a task (i.e. remove it from the user's task list).
 
         Args:
             name (TaskName): The name of the task to delete.
         """
-        logger.info(f"The delete_task tool was called with name = ({name})")
-        user_id = context.session.userdata.id
-        try:
-            result = await db.delete_task(user_id, name)
+        logger.info(
+            "The delete_task tool was called with name = (%s)",
+            name,
+            extra={"tool": "delete_task"},
+        )
+        result = await actions.delete_task(name)
+        record_results(context, "delete", [result])
+        return result.message
 
-            if isinstance(result, TaskNotFoundError):
-                return f"Failed to delete a task with the name '{name}'. No matching task was found."
+    @function_tool()
+    @traced("tool.create_tasks")
+    async def create_tasks(context: RunContext, tasks: list[TaskSpec]) -> str:
+        """Create several new tasks at once. Each task name should use the Title Case capitalization style.
 
-            if isinstance(result, TaskError):
-                return f"Failed to delete a task with the name '{name}'. An unknown error occurred."
+        Args:
+            tasks (list[TaskSpec]): The tasks to create. Each has a name, and optionally a completion status, a deadline (in a 24-hour time format), and a description.
+        """
+        logger.info(
+            "The 'create_tasks' tool was called with names = (%s).",
+            [task.name for task in tasks],
+            extra={"tool": "create_tasks"},
+        )
+        results = await actions.create_tasks(tasks)
+        record_results(context, "create", results)
+        return " ".join(result.message for result in results)
 
-            await update_room_metadata("DELETE", context, name=name)
+    @function_tool()
+    @traced("tool.edit_tasks")
+    async def edit_tasks(context: RunContext, edits: list[TaskEdit]) -> str:
+        """Edit several existing tasks at once. Each edit follows the same rules as the 'edit_task' function.
 
-            return f"Deleted the task: '{name}'."
-        except Exception as ex:
-            logger.error("Error while deleting task")
-            raise ex
+        Args:
+            edits (list[TaskEdit]): The edits to make. Each has the name of the task being edited, and optionally a new name, a completion status, a new deadline ("No Update" to forgo updating it, None to remove it), and a new description (an empty string to remove it).
+        """
+        logger.info(
+            "The 'edit_tasks' tool was called with names = (%s).",
+            [edit.name for edit in edits],
+            extra={"tool": "edit_tasks"},
+        )
+        results = await actions.edit_tasks(edits)
+        record_results(context, "edit", results)
+        return " ".join(result.message for result in results)
 
     @function_tool()
+    @traced("tool.delete_tasks")
+    async def delete_tasks(context: RunContext, names: list[TaskName]) -> str:
+        """Delete several tasks at once (i.e. remove them from the user's task list).
+
+        Args:
+            names (list[TaskName]): The names of the tasks to delete.
+        """
+        logger.info(
+            "The 'delete_tasks' tool was called with names = (%s).",
+            names,
+            extra={"tool": "delete_tasks"},
+        )
+        results = await actions.delete_tasks(names)
+        record_results(context, "delete", results)
+        return " ".join(result.message for result in results)
+
+    @function_tool()
+    @traced("tool.query_tasks")
+    async def query_tasks(
+        context: RunContext,
+        filter: TaskFilter,
+        order: Literal["deadline", "name"] = "deadline",
+    ) -> str:
+        """List the user's tasks that match a filter, without changing them.
+
+        Args:
+            filter (TaskFilter): Which tasks to list. Each field is optional: the completion status, a range of deadlines (due_after inclusive, due_before exclusive), and the beginning of the task name. Leave a field unset to not filter by it.
+            order (Literal["deadline", "name"]): Sort by nearest deadline (tasks without a deadline last), or by name. Defaults to "deadline".
+        """
+        logger.info(
+            "The 'query_tasks' tool was called with filter = (%s).",
+            filter.model_dump(exclude_none=True),
+            extra={"tool": "query_tasks"},
+        )
+        page = await db.query_tasks(userdata.id, filter, order, QUERY_TASKS_LIMIT)
+        if not page.tasks:
+            return "No tasks match the query."
+        more = (
+            f" Only the first {QUERY_TASKS_LIMIT} are listed; narrow the query to see the others."
+            if page.cursor is not None
+            else ""
+        )
+        return f"{len(page.tasks)} task(s) match the query.{more}\n{task_table(page.tasks)}"
+
+    @function_tool()
+    @traced("tool.invalid_request")
     async def invalid_request(context: RunContext):
         """Notifies the user that they have made an invalid request. Use this tool when a user's request does not pertain to managing their tasks."""
-        logger.info("The invalid_request tool was called.")
+        logger.info(
+            "The invalid_request tool was called.", extra={"tool": "invalid_request"}
+        )
         return "Invalid Request."
 
-    tools: Tools = [create_task, edit_task, delete_task, invalid_request]
+    return [
+        create_task,
+        edit_task,
+        delete_task,
+        create_tasks,
+        edit_tasks,
+        delete_tasks,
+        query_tasks,
+        invalid_request,
+    ]
+
+
+def make_task_assistant(
+    userdata: UserData, writer: BufferedTextWriter
+) -> TaskAssistant:
+    """Build the assistant (and its tools) of the user's session.
+
+    The fast path for simple commands and the templated confirmations are enabled unless
+    INTENT_FAST_PATH or TEMPLATED_CONFIRMATIONS is "0".
+    """
+    actions = TaskActions(userdata.id, userdata.task_cache)
+
+    # Simple commands (e.g. "mark X as done") are answered without the LLM.
+    intent_router = None
+    if os.environ.get("INTENT_FAST_PATH", "1") != "0":
+        intent_router = IntentRouter(userdata.task_cache, actions)
+
+    # The confirmations of unambiguous tool outcomes are templated rather than generated.
+    tool_replies = None
+    if os.environ.get("TEMPLATED_CONFIRMATIONS", "1") != "0":
+        tool_replies = ToolReplies()
+
+    return TaskAssistant(
+        writer,
+        init_instructions=task_assistant_instructions,
+        tools=make_tools(userdata, actions, tool_replies),
+        task_token_budget=int(env_number("TASK_PROMPT_TOKEN_BUDGET", 1500)),
+        keep_turns=int(env_number("CHAT_KEEP_TURNS", 6)),
+        history_token_budget=int(env_number("CHAT_HISTORY_TOKEN_BUDGET", 2000)),
+        intent_router=intent_router,
+        tool_replies=tool_replies,
+    )
 
-    room = get_job_context().room
-    writer = await room.local_participant.stream_text(topic="task-assistant--text")
 
-    task_assistant = TaskAssistant(
-        writer, init_instructions=task_assistant_instructions, tools=tools
+async def entrypoint(ctx: agents.JobContext):
+    await ctx.connect()
+    set_log_fields(room=ctx.room.name)
+
+    lkapi = await resources.acquire(ctx)
+    metadata_publisher: Optional[RoomMetadataPublisher] = None
+
+    async def release_resources():
+        if metadata_publisher is not None:
+            db.task_changes.unsubscribe(userdata.id, metadata_publisher)
+            await metadata_publisher.aclose()
+        await resources.release()
+
+    ctx.add_shutdown_callback(release_resources)
+
+    userdata = await get_user_data(ctx)
+    set_log_fields(user_id=userdata.id)
+
+    # Task changes (with their seq in the task change feed) are relayed to the webapp.
+    metadata_publisher = RoomMetadataPublisher(lkapi.room, ctx.room.name, userdata.id)
+    db.task_changes.subscribe(userdata.id, metadata_publisher)
+
+    ac = await db.getAgentConfig(userdata.id)
+    db.task_changes.subscribe(userdata.id, userdata.task_cache)
+    await userdata.task_cache.load()
+
+    async def close_task_cache():
+        db.task_changes.unsubscribe(userdata.id, userdata.task_cache)
+        logger.info(
+            "Task cache stats for user (%s): %s.",
+            userdata.id,
+            userdata.task_cache.stats(),
+        )
+
+    ctx.add_shutdown_callback(close_task_cache)
+
+    session = AgentSession[UserData](
+        stt=deepgram.STT(model=ac.stt_model, api_key=ac.stt_key, language="multi"),
+        llm=openai.LLM(
+            model=ac.llm_model, api_key=ac.llm_key, max_completion_tokens=2500
+        ),
+        tts=cartesia.TTS(model=ac.tts_model, api_key=ac.tts_key)
+        if ac.tts_key is not None and ac.tts_model is not None
+        else NOT_GIVEN,
+        vad=ctx.proc.userdata["vad"],
+        userdata=userdata,
     )
 
+    room = get_job_context().room
+    writer = BufferedTextWriter(
+        await room.local_participant.stream_text(topic="task-assistant--text")
+    )
+    ctx.add_shutdown_callback(writer.aclose)
+
+    task_assistant = make_task_assistant(userdata, writer)
+
+    async def log_session_stats():
+        if task_assistant.intent_router is not None:
+            logger.info(
+                "Intent fast path stats for user (%s): %s.",
+                userdata.id,
+                task_assistant.intent_router.stats(),
+            )
+        if task_assistant.tool_replies is not None:
+            logger.info(
+                "Tool reply stats for user (%s): %s.",
+                userdata.id,
+                task_assistant.tool_replies.stats(),
+            )
+
+    ctx.add_shutdown_callback(log_session_stats)
+
     await session.start(
         agent=task_assistant,
         room=ctx.room,
@@ -251,6 +401,51 @@ async def entrypoint(ctx: agents.JobContext):
     )
     await task_assistant._update_instructions(task_assistant_instructions)
 
+    async def remind(name: str, deadline: datetime):
+        text = reminder(name, deadline)
+        task_assistant.writer.write(text)
+        task_assistant.writer.flush_nowait()
+        session.say(text)
+
+    await reminders.add_user(userdata.id, userdata.task_cache, remind)
+
+    async def stop_reminders():
+        reminders.remove_user(userdata.id)
+
+    ctx.add_shutdown_callback(stop_reminders)
+
+
+class TaskManagerServer(agents.AgentServer):
+    """The worker. It stops the guest reaper (see `__main__`) when it shuts down, before
+    waiting for its jobs to end."""
+
+    async def aclose(self) -> None:
+        await guest_reaper.stop()
+        await super().aclose()
+
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
+    prometheus_port = os.environ.get("AGENT_PROMETHEUS_PORT")
+    server = TaskManagerServer.from_server_options(
+        agents.WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=resources.prewarm,
+            # One process per job: the resources that prewarm opens assume it.
+            job_executor_type=JobExecutorType.PROCESS,
+            prometheus_port=int(prometheus_port) if prometheus_port else NOT_GIVEN,
+            # The job processes write their metrics (e.g. the stage histograms) there, and
+            # the worker serves them all. It creates and empties the directory at startup.
+            prometheus_multiproc_dir=(
+                os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+                or os.path.join(
+                    tempfile.gettempdir(), f"agent-prometheus-{prometheus_port}"
+                )
+            )
+            if prometheus_port
+            else None,
+        )
+    )
+    if os.environ.get("GUEST_REAPER", "0") == "1":
+        # In the worker's main process: one reaper per worker, not one per job process.
+        server.on("worker_started", lambda: asyncio.create_task(guest_reaper.start()))
+    agents.cli.run_app(server)
@@ -0,0 +1,227 @@
+"""Load-test the database layer with concurrent simulated sessions.
+
+Each session starts like a job does (fetching the agent config and the task list) and
+then issues a random mix of `get_tasks`, `create_task`, `edit_task` and `delete_task`
+calls until the run ends. The report has the throughput and latency percentiles of each
+operation, and the time spent waiting for a pooled connection.
+
+The database must have been built from `db/task-manager-scripts` (including
+`enable_encryption.sql`), and DATABASE_URL must point at it. The benchmark creates its own
+guest users and deletes them (and their tasks and configs) when it is done.
+
+Run from the agent directory: `python -m benchmarks.db_load --sessions 16 --duration 10`
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+
+from benchmarks.stats import git_commit, summarize
+
+os.environ.setdefault("PG_ENCRYPTION_KEY", "db-load-benchmark")
+
+import db  # reads PG_ENCRYPTION_KEY
+
+# Relative weights of the operations issued after a session has started.
+MIX = {"get_tasks": 40, "create_task": 25, "edit_task": 20, "delete_task": 15}
+
+
+async def _create_users(count: int) -> list[str]:
+    encryption_key = os.environ["PG_ENCRYPTION_KEY"]
+    user_ids = []
+    async with db.pool.connection() as conn:
+        async with conn.transaction():
+            for _ in range(count):
+                cur = await conn.execute(
+                    """INSERT INTO "user" (name, is_guest) VALUES ('db_load benchmark', true) RETURNING id;"""
+                )
+                row = await cur.fetchone()
+                assert row is not None
+                user_id = str(row[0])
+                for table, model in (
+                    ("stt", "nova-3"),
+                    ("llm", "gpt-4.1-mini"),
+                    ("tts", "sonic-2"),
+                ):
+                    await conn.execute(
+                        f"""INSERT INTO {table} (user_id, provider, key, model)
+                        VALUES (%s, 'benchmark', task_manager.encrypt_api_key(%s, %s), %s);""",
+                        (user_id, f"{table}-key", encryption_key, model),
+                    )
+                user_ids.append(user_id)
+    return user_ids
+
+
+async def _delete_users(user_ids: list[str]) -> None:
+    async with db.pool.connection() as conn:
+        async with conn.transaction():
+            for table in ("task", "stt", "llm", "tts"):
+                await conn.execute(
+                    f"DELETE FROM {table} WHERE user_id = ANY(%s::uuid[]);",
+                    (user_ids,),
+                )
+            await conn.execute(
+                """DELETE FROM "user" WHERE id = ANY(%s::uuid[]);""", (user_ids,)
+            )
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def time(
+        self, op: str, call: Callable[..., Awaitable[Any]], *args: Any
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await call(*args)
+        except Exception:
+            self.errors[op] += 1
+            return None
+        self.latencies[op].append((time.perf_counter() - start) * 1000)
+        if isinstance(result, Exception):  # db functions return their errors
+            self.errors[op] += 1
+        return result
+
+
+async def _session(
+    user_id: str,
+    recorder: _Recorder,
+    deadline: float,
+    think_time: float,
+    rng: random.Random,
+) -> None:
+    await recorder.time("getAgentConfig", db.getAgentConfig, user_id)
+    await recorder.time("get_tasks", db.get_tasks, user_id)
+
+    names: list[str] = []
+    counter = 0
+    ops, weights = list(MIX), list(MIX.values())
+    while time.perf_counter() < deadline:
+        op = rng.choices(ops, weights)[0]
+        if op in ("edit_task", "delete_task") and not names:
+            op = "create_task"
+
+        if op == "get_tasks":
+            await recorder.time(op, db.get_tasks, user_id)
+        elif op == "create_task":
+            counter += 1
+            name = f"Benchmark Task {counter}"
+            result = await recorder.time(
+                op,
+                db.create_task,
+                user_id,
+                name,
+                False,
+                datetime.now() + timedelta(days=rng.randint(1, 30)),
+                "Created by the db_load benchmark.",
+            )
+            if result == "Success":
+                names.append(name)
+        elif op == "edit_task":
+            name = rng.choice(names)
+            await recorder.time(
+                op,
+                db.edit_task,
+                user_id,
+                name,
+                {"is_complete": rng.random() < 0.5, "description": "Edited."},
+            )
+        else:
+            name = names.pop(rng.randrange(len(names)))
+            await recorder.time(op, db.delete_task, user_id, name)
+
+        if think_time:
+            await asyncio.sleep(think_time)
+
+
+async def run(sessions: int, duration: float, think_time: float, seed: int) -> dict:
+    await db.init_pool()
+    user_ids = await _create_users(sessions)
+    try:
+        recorder = _Recorder()
+        before = db.pool_metrics()
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                _session(
+                    user_id,
+                    recorder,
+                    start + duration,
+                    think_time,
+                    random.Random(seed + i),
+                )
+                for i, user_id in enumerate(user_ids)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        after = db.pool_metrics()
+    finally:
+        await _delete_users(user_ids)
+        await db.close_pool()
+
+    checkouts = after["checkouts"] - before["checkouts"]
+    queued = after["checkouts_queued"] - before["checkouts_queued"]
+    wait_ms = after["wait_ms_total"] - before["wait_ms_total"]
+    total_ops = sum(len(samples) for samples in recorder.latencies.values())
+    return {
+        "benchmark": "db_load",
+        "commit": git_commit(),
+        "unit": "ms",
+        "config": {
+            "sessions": sessions,
+            "duration_s": duration,
+            "think_time_s": think_time,
+            "seed": seed,
+            "mix": MIX,
+            "pool_min_size": after["min_size"],
+            "pool_max_size": after["max_size"],
+        },
+        "elapsed_s": elapsed,
+        "throughput_ops_s": total_ops / elapsed,
+        "operations": {
+            op: {
+                "throughput_ops_s": len(samples) / elapsed,
+                "errors": recorder.errors[op],
+                "latency": summarize(samples),
+            }
+            for op, samples in sorted(recorder.latencies.items())
+        },
+        "pool": {
+            "checkouts": checkouts,
+            "checkouts_queued": queued,
+            "wait_ms_total": wait_ms,
+            "wait_ms_per_checkout": wait_ms / checkouts if checkouts else 0.0,
+            "wait_ms_per_queued_checkout": wait_ms / queued if queued else 0.0,
+            "timeouts": after["timeouts"] - before["timeouts"],
+            "size": after["size"],
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="seconds each session waits between operations",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.sessions, args.duration, args.think_time, args.seed))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Stand-ins for the STT, LLM and TTS plugins, the session's audio input and output, the
+room service and the text stream, for running a session offline (see benchmarks/replay.py).
+
+Each has a configurable latency and counts its calls. The STT transcribes the utterances
+passed to `FakeSTT.say`, and the LLM replays scripted responses (text, or tool calls) in
+order, rather than generating them. The TTS synthesizes silence.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from livekit import rtc
+from livekit.agents import llm, stt, tts
+from livekit.agents.llm import ChatChunk, ChoiceDelta, FunctionToolCall
+from livekit.agents.types import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectOptions,
+    NotGivenOr,
+)
+from livekit.agents.voice import io
+from livekit.protocol.room import UpdateRoomMetadataRequest
+
+# The reply to an LLM request that has no scripted response left.
+UNSCRIPTED_REPLY = "Okay."
+
+
+@dataclass
+class LLMResponse:
+    """A scripted response: text, or tool calls as (name, arguments) pairs."""
+
+    text: str = ""
+    tool_calls: list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "LLMResponse":
+        return cls(
+            text=data.get("text", ""),
+            tool_calls=[
+                (call["name"], call.get("arguments", {}))
+                for call in data.get("tool_calls", [])
+            ],
+        )
+
+
+class FakeLLMStream(llm.LLMStream):
+    def __init__(self, fake: "FakeLLM", response: LLMResponse, **kwargs: Any) -> None:
+        super().__init__(fake, **kwargs)
+        self._fake = fake
+        self._response = response
+
+    async def _run(self) -> None:
+        start = time.perf_counter()
+        await asyncio.sleep(self._fake.ttft)
+        self._fake.ttft_seconds.append(time.perf_counter() - start)
+        id = f"fake-{self._fake.requests}"
+        if self._response.tool_calls:
+            self._event_ch.send_nowait(
+                ChatChunk(
+                    id=id,
+                    delta=ChoiceDelta(
+                        role="assistant",
+                        tool_calls=[
+                            FunctionToolCall(
+                                name=name,
+                                arguments=json.dumps(arguments),
+                                call_id=f"call-{self._fake.requests}-{i}",
+                            )
+                            for i, (name, arguments) in enumerate(
+                                self._response.tool_calls
+                            )
+                        ],
+                    ),
+                )
+            )
+            return
+        words = self._response.text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self._fake.token_interval)
+            content = word if i == len(words) - 1 else f"{word} "
+            self._event_ch.send_nowait(
+                ChatChunk(id=id, delta=ChoiceDelta(role="assistant", content=content))
+            )
+
+
+class FakeLLM(llm.LLM):
+    """Replays the responses queued with `script`, one per request.
+
+    A response starts after `ttft` seconds, and its text is streamed a word every
+    `token_interval` seconds. A request with no response left is answered with
+    UNSCRIPTED_REPLY and counted in `unscripted`.
+    """
+
+    def __init__(self, ttft: float = 0.4, token_interval: float = 0.02) -> None:
+        super().__init__()
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self._responses: list[LLMResponse] = []
+        self.requests = 0
+        self.unscripted = 0
+        self.ttft_seconds: list[float] = []
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def script(self, responses: list[LLMResponse]) -> None:
+        """Replace the queued responses."""
+        self._responses = list(responses)
+
+    @property
+    def unused(self) -> int:
+        """The number of queued responses that were not requested."""
+        return len(self._responses)
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: Optional[list[llm.Tool]] = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs: Any,
+    ) -> FakeLLMStream:
+        self.requests += 1
+        if self._responses:
+            response = self._responses.pop(0)
+        else:
+            self.unscripted += 1
+            response = LLMResponse(text=UNSCRIPTED_REPLY)
+        return FakeLLMStream(
+            self,
+            response,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+        )
+
+
+class FakeSpeechStream(stt.RecognizeStream):
+    def __init__(self, fake: "FakeSTT", conn_options: APIConnectOptions) -> None:
+        super().__init__(stt=fake, conn_options=conn_options)
+        self._fake = fake
+
+    async def _run(self) -> None:
+        async def drain() -> None:
+            async for _ in self._input_ch:
+                pass
+
+        drain_task = asyncio.create_task(drain())
+        try:
+            while True:
+                text = await self._fake._utterances.get()
+                self._event_ch.send_nowait(
+                    stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH)
+                )
+                await asyncio.sleep(self._fake.delay)
+                self._fake.requests += 1
+                self._event_ch.send_nowait(
+                    stt.SpeechEvent(
+                        type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                        alternatives=[stt.SpeechData(language="en", text=text)],
+                    )
+                )
+                self._event_ch.send_nowait(
+                    stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH)
+                )
+        finally:
+            drain_task.cancel()
+
+
+class FakeSTT(stt.STT):
+    """A streaming STT that ignores its audio, and transcribes each utterance passed to
+    `say` (i.e. spoken by the user, who then stops speaking) `delay` seconds later."""
+
+    def __init__(self, delay: float = 0.15) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(streaming=True, interim_results=False)
+        )
+        self.delay = delay
+        self._utterances: asyncio.Queue[str] = asyncio.Queue()
+        self.requests = 0
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def say(self, text: str) -> None:
+        self._utterances.put_nowait(text)
+
+    async def _recognize_impl(self, buffer: Any, **kwargs: Any) -> stt.SpeechEvent:
+        raise NotImplementedError("FakeSTT only transcribes streams.")
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> FakeSpeechStream:
+        return FakeSpeechStream(self, conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    def __init__(self, fake: "FakeTTS", text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=fake, input_text=text, conn_options=conn_options)
+        self._fake = fake
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        fake = self._fake
+        start = time.perf_counter()
+        output_emitter.initialize(
+            request_id=f"fake-{fake.requests}",
+            sample_rate=fake.sample_rate,
+            num_channels=fake.num_channels,
+            mime_type="audio/pcm",
+        )
+        await asyncio.sleep(fake.ttfb)
+        # 50 ms of silence per word.
+        samples = fake.sample_rate // 20 * max(1, len(self.input_text.split()))
+        output_emitter.push(bytes(2 * samples * fake.num_channels))
+        fake.first_audio_seconds.append(time.perf_counter() - start)
+        output_emitter.flush()
+
+
+class FakeTTS(tts.TTS):
+    """Synthesizes silence, starting `ttfb` seconds after the request."""
+
+    def __init__(self, ttfb: float = 0.12) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=24000,
+            num_channels=1,
+        )
+        self.ttfb = ttfb
+        self.requests = 0
+        self.first_audio_seconds: list[float] = []
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> FakeChunkedStream:
+        self.requests += 1
+        return FakeChunkedStream(self, text, conn_options)
+
+
+class FakeAudioInput(io.AudioInput):
+    """The user's microphone: silence, in 100 ms frames, in real time."""
+
+    def __init__(self) -> None:
+        super().__init__(label="fake")
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        await asyncio.sleep(0.1)
+        return rtc.AudioFrame.create(
+            sample_rate=16000, num_channels=1, samples_per_channel=1600
+        )
+
+
+class FakeAudioOutput(io.AudioOutput):
+    """Plays each segment of audio as soon as it is flushed, without waiting for its
+    duration. `first_frame_at` has the time (perf_counter) of the first frame of each
+    segment."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            label="fake", capabilities=io.AudioOutputCapabilities(pause=False)
+        )
+        self.first_frame_at: list[float] = []
+        self._position = 0.0
+        self._playing = False
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if not self._playing:
+            self._playing = True
+            self.first_frame_at.append(time.perf_counter())
+            self.on_playback_started(created_at=time.time())
+        self._position += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        self._finish(interrupted=False)
+
+    def clear_buffer(self) -> None:
+        self._finish(interrupted=True)
+
+    def _finish(self, interrupted: bool) -> None:
+        if not self._playing:
+            return
+        self._playing = False
+        position, self._position = self._position, 0.0
+        self.on_playback_finished(playback_position=position, interrupted=interrupted)
+
+
+class FakeRoomService:
+    """Accepts room metadata updates after `delay` seconds (see metadata_publisher.py)."""
+
+    def __init__(self, delay: float = 0.03) -> None:
+        self.delay = delay
+        self.updates = 0
+        self.bytes_sent = 0
+
+    async def update_room_metadata(self, update: UpdateRoomMetadataRequest) -> None:
+        await asyncio.sleep(self.delay)
+        self.updates += 1
+        self.bytes_sent += len(update.metadata)
+
+
+class FakeTextStream:
+    """A text stream that only counts what is written to it (see buffered_writer.py)."""
+
+    def __init__(self) -> None:
+        self.writes = 0
+        self.chars = 0
+
+    async def write(self, text: str) -> None:
+        self.writes += 1
+        self.chars += len(text)
+
+    async def aclose(self) -> None:
+        pass
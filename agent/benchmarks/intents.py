@@ -0,0 +1,87 @@
+"""Measure how many utterances the intent fast path answers, and how accurately.
+
+Each line of the corpus has an utterance and the intent it should be parsed to, or null if
+it should be left to the LLM. The report has the hit rate (the share of the corpus answered
+without the LLM), the precision of those answers, the false positives (utterances that
+should have been left to the LLM), the misses, and the mean parse time.
+
+Run from the agent directory: `python -m benchmarks.intents`
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from benchmarks.stats import git_commit
+from intents import parse_intent
+
+CORPUS = os.path.join(os.path.dirname(__file__), "intent_corpus.jsonl")
+
+# The corpus' relative deadlines ("tomorrow", "next monday") are relative to this time.
+NOW = datetime(2026, 10, 16, 10, 0)  # A Friday morning.
+
+
+def _as_dict(intent) -> dict | None:
+    if intent is None:
+        return None
+    return {
+        "action": intent.action,
+        "name": intent.name,
+        "deadline": intent.deadline.isoformat() if intent.deadline else None,
+    }
+
+
+def run(corpus: str, repeat: int) -> dict:
+    with open(corpus) as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    hits = correct = 0
+    false_positives: list[dict] = []
+    wrong: list[dict] = []
+    misses: list[str] = []
+    elapsed = 0.0
+    for case in cases:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            intent = parse_intent(case["text"], NOW)
+        elapsed += time.perf_counter() - start
+
+        parsed, expected = _as_dict(intent), case["expected"]
+        if parsed is None:
+            if expected is not None:
+                misses.append(case["text"])
+            continue
+        hits += 1
+        if parsed == expected:
+            correct += 1
+        elif expected is None:
+            false_positives.append({"text": case["text"], "parsed": parsed})
+        else:
+            wrong.append({"text": case["text"], "parsed": parsed, "expected": expected})
+
+    expected_hits = sum(case["expected"] is not None for case in cases)
+    return {
+        "commit": git_commit(),
+        "utterances": len(cases),
+        "hit_rate": hits / len(cases),
+        "recall": correct / expected_hits if expected_hits else None,
+        "precision": correct / hits if hits else None,
+        "false_positives": false_positives,
+        "wrong": wrong,
+        "misses": misses,
+        "mean_parse_us": elapsed / (len(cases) * repeat) * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.corpus, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Replay recorded sessions offline, through the assistant, its tools and the database.
+
+Each session is replayed in a real `AgentSession`, running the same `TaskAssistant` and
+tools as the agent (see `make_task_assistant` in agent.py), for a new guest user with the
+session's initial tasks. The STT, LLM and TTS are stand-ins with fixed latencies (see
+benchmarks/fakes.py), plugged into the session: each user turn is spoken to the STT, which
+transcribes it, and the LLM replays the responses recorded for that turn (a turn answered by
+the fast path or a templated reply leaves some of them unused). The replies are synthesized
+by the TTS and played to an audio output that does not wait for the audio's duration (the
+agent's room audio output is disabled in production, where only the transcription is
+sent). The task changes are published to a stand-in room service, through the database's
+change notifications.
+
+For each turn, the report has:
+- the latency of the STT (from the end of the user's speech to the transcript), the agent
+  (from the transcript to the end of the reply, including its audio), the TTS (from a
+  request to its first audio, for the turn's first request), the first audio of the reply
+  (from the end of the user's speech), and the whole turn;
+- the time spent in each traced stage (LLM, instructions, tools, database queries);
+- the number of LLM requests, database queries, metadata updates and text stream packets.
+
+A session has initial `tasks` (as passed to the create_tasks tool), and either `turns`
+(`{"user": "...", "llm": [{"text": "..."} or {"tool_calls": [{"name", "arguments"}]}]}`)
+or the `history` of a real session (exported with `session.history.to_dict()`).
+
+With `--baseline`, the summary is compared to that of a previous report: more calls, or a
+mean latency more than `--tolerance` higher, are reported as regressions (and the exit
+status is 1).
+
+The database must have been built from `db/task-manager-scripts`, and DATABASE_URL must
+point at it. The guest users are deleted (with their tasks) when the replay is done.
+
+Run from the agent directory: `python -m benchmarks.replay > report.json`
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any
+
+# Keep every traced stage's durations in memory (see tracing.py).
+os.environ["AGENT_TRACING"] = "memory"
+
+from livekit.agents import AgentSession
+from livekit.agents.voice import SpeechHandle
+from livekit.agents.voice.events import (
+    ConversationItemAddedEvent,
+    FunctionToolsExecutedEvent,
+    SpeechCreatedEvent,
+    UserInputTranscribedEvent,
+)
+
+import db
+from agent import UserData, make_task_assistant, task_assistant_instructions
+from benchmarks.fakes import (
+    FakeAudioInput,
+    FakeAudioOutput,
+    FakeLLM,
+    FakeRoomService,
+    FakeSTT,
+    FakeTextStream,
+    FakeTTS,
+    LLMResponse,
+)
+from benchmarks.stats import git_commit, summarize
+from buffered_writer import BufferedTextWriter
+from custom_types import TaskSpec
+from metadata_publisher import RoomMetadataPublisher
+from task_cache import TaskCache
+from tracing import tracer
+
+SESSIONS = os.path.join(os.path.dirname(__file__), "replay_sessions.json")
+
+LATENCIES = ("stt_ms", "agent_ms", "tts_first_audio_ms", "first_audio_ms", "total_ms")
+CALLS = ("llm_requests", "db_queries", "metadata_updates", "text_packets")
+
+
+@dataclass
+class Turn:
+    user: str
+    responses: list[LLMResponse]
+
+
+@dataclass
+class Session:
+    name: str
+    tasks: list[TaskSpec]
+    turns: list[Turn]
+
+
+def _text(item: dict[str, Any]) -> str:
+    return " ".join(part for part in item.get("content", []) if isinstance(part, str))
+
+
+def turns_from_history(items: list[dict[str, Any]]) -> list[Turn]:
+    """The turns of a chat history: each user message, and the assistant's messages and
+    tool calls up to the next one (consecutive tool calls are one LLM response)."""
+    turns: list[Turn] = []
+    previous = None
+    for item in items:
+        kind = item.get("type")
+        if kind == "message" and item.get("role") == "user":
+            turns.append(Turn(_text(item), []))
+        elif not turns:
+            pass
+        elif kind == "message" and item.get("role") == "assistant":
+            turns[-1].responses.append(LLMResponse(text=_text(item)))
+        elif kind == "function_call":
+            call = (item["name"], json.loads(item.get("arguments") or "{}"))
+            if previous == "function_call":
+                turns[-1].responses[-1].tool_calls.append(call)
+            else:
+                turns[-1].responses.append(LLMResponse(tool_calls=[call]))
+        previous = kind
+    return turns
+
+
+def load_sessions(path: str) -> list[Session]:
+    with open(path) as f:
+        data = json.load(f)
+    sessions = []
+    for session in data:
+        if "history" in session:
+            turns = turns_from_history(session["history"]["items"])
+        else:
+            turns = [
+                Turn(
+                    turn["user"],
+                    [LLMResponse.from_dict(response) for response in turn["llm"]],
+                )
+                for turn in session["turns"]
+            ]
+        sessions.append(
+            Session(
+                session["name"],
+                [TaskSpec.model_validate(task) for task in session.get("tasks", [])],
+                turns,
+            )
+        )
+    return sessions
+
+
+@dataclass
+class Fakes:
+    stt: FakeSTT
+    llm: FakeLLM
+    tts: FakeTTS
+    room: FakeRoomService
+
+
+async def _create_user() -> str:
+    async with db.pool.connection() as conn:
+        cur = await conn.execute(
+            """INSERT INTO "user" (name, is_guest) VALUES ('replay benchmark', true) RETURNING id;"""
+        )
+        row = await cur.fetchone()
+        assert row is not None
+        return str(row[0])
+
+
+async def _delete_user(user_id: str) -> None:
+    async with db.pool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM task WHERE user_id = %s;", (user_id,))
+            await conn.execute("""DELETE FROM "user" WHERE id = %s;""", (user_id,))
+
+
+def _stages() -> dict[str, list[float]]:
+    assert tracer.samples is not None
+    samples = {stage: list(durations) for stage, durations in tracer.samples.items()}
+    tracer.samples.clear()
+    return samples
+
+
+class _TurnEvents:
+    """Follows a turn through the session's events: the user's transcript, the speech that
+    answers it (the reply, and any reply to its tool calls), and what the agent said and
+    did."""
+
+    def __init__(self, session: AgentSession) -> None:
+        self.session = session
+        self.transcribed = asyncio.Event()
+        self.transcribed_at = 0.0
+        self.speech_created = asyncio.Event()
+        self.speech: list[SpeechHandle] = []
+        self.replies: list[str] = []
+        self.tools: list[str] = []
+        self._handlers = {
+            "user_input_transcribed": self._on_transcript,
+            "speech_created": self._on_speech,
+            "conversation_item_added": self._on_item,
+            "function_tools_executed": self._on_tools,
+        }
+        for event, handler in self._handlers.items():
+            session.on(event, handler)
+
+    def _on_transcript(self, event: UserInputTranscribedEvent) -> None:
+        if event.is_final and not self.transcribed.is_set():
+            self.transcribed_at = time.perf_counter()
+            self.transcribed.set()
+
+    def _on_speech(self, event: SpeechCreatedEvent) -> None:
+        self.speech.append(event.speech_handle)
+        self.speech_created.set()
+
+    def _on_item(self, event: ConversationItemAddedEvent) -> None:
+        item = event.item
+        if getattr(item, "role", None) == "assistant" and item.text_content:
+            self.replies.append(item.text_content)
+
+    def _on_tools(self, event: FunctionToolsExecutedEvent) -> None:
+        self.tools += [call.name for call in event.function_calls]
+
+    async def done(self, timeout: float) -> float:
+        """Wait for the reply (and the replies to its tool calls) to end, and return when
+        (perf_counter) it did."""
+        await asyncio.wait_for(self.transcribed.wait(), timeout)
+        await asyncio.wait_for(self.speech_created.wait(), timeout)
+        while pending := [speech for speech in self.speech if not speech.done()]:
+            await asyncio.wait_for(pending[0].wait_for_playout(), timeout)
+        return time.perf_counter()
+
+    def close(self) -> None:
+        for event, handler in self._handlers.items():
+            self.session.off(event, handler)
+
+
+class _Replay:
+    """One session's agent, and the per-turn measurements of its replay."""
+
+    def __init__(self, session: Session, fakes: Fakes, settle: float) -> None:
+        self.session = session
+        self.fakes = fakes
+        self.settle = settle
+
+    async def _settle(self) -> None:
+        # Let the task change notifications of the last writes arrive, and be published.
+        await asyncio.sleep(self.settle)
+        await self.publisher.flush()
+        await self.writer.flush()
+
+    async def run(self) -> list[dict[str, Any]]:
+        user_id = await _create_user()
+        userdata = UserData(id=user_id, task_cache=TaskCache(user_id))
+        self.publisher = RoomMetadataPublisher(self.fakes.room, "replay", user_id)
+        self.text_stream = FakeTextStream()
+        self.writer = BufferedTextWriter(self.text_stream)
+        agent_session = AgentSession[UserData](
+            stt=self.fakes.stt,
+            llm=self.fakes.llm,
+            tts=self.fakes.tts,
+            userdata=userdata,
+            # The user's turn ends with the STT's transcript, without an endpointing
+            # delay, and a reply is only generated then (it is what the LLM is scripted
+            # for). The user never talks over the agent.
+            turn_handling={
+                "turn_detection": "stt",
+                "endpointing": {"min_delay": 0.0},
+                "interruption": {"enabled": False, "resume_false_interruption": False},
+                "preemptive_generation": {"enabled": False},
+            },
+        )
+        agent_session.input.audio = FakeAudioInput()
+        self.audio_output = FakeAudioOutput()
+        agent_session.output.audio = self.audio_output
+        try:
+            if self.session.tasks:
+                await db.create_tasks(user_id, self.session.tasks)
+            db.task_changes.subscribe(user_id, self.publisher)
+            db.task_changes.subscribe(user_id, userdata.task_cache)
+            await userdata.task_cache.load()
+
+            assistant = make_task_assistant(userdata, self.writer)
+            await agent_session.start(agent=assistant)
+            await assistant._update_instructions(task_assistant_instructions)
+            await self._settle()
+            _stages()
+
+            return [
+                await self._turn(agent_session, i, turn)
+                for i, turn in enumerate(self.session.turns)
+            ]
+        finally:
+            db.task_changes.unsubscribe(user_id, userdata.task_cache)
+            db.task_changes.unsubscribe(user_id, self.publisher)
+            await agent_session.aclose()
+            await self.publisher.aclose()
+            await self.writer.aclose()
+            await _delete_user(user_id)
+
+    async def _turn(
+        self, agent_session: AgentSession, index: int, turn: Turn
+    ) -> dict[str, Any]:
+        fakes = self.fakes
+        fakes.llm.script(turn.responses)
+        llm_requests = fakes.llm.requests
+        unscripted = fakes.llm.unscripted
+        metadata_updates = fakes.room.updates
+        text_packets = self.text_stream.writes
+        tts_requests = len(fakes.tts.first_audio_seconds)
+        audio_segments = len(self.audio_output.first_frame_at)
+
+        events = _TurnEvents(agent_session)
+        try:
+            start = time.perf_counter()
+            fakes.stt.say(turn.user)
+            end = await events.done(timeout=30)
+        finally:
+            events.close()
+        await self._settle()
+
+        first_audio = fakes.tts.first_audio_seconds[tts_requests:]
+        first_frames = self.audio_output.first_frame_at[audio_segments:]
+
+        stages = _stages()
+        db_queries = Counter(
+            {
+                stage: len(durations)
+                for stage, durations in stages.items()
+                if stage.startswith("db.")
+            }
+        )
+        return {
+            "session": self.session.name,
+            "turn": index,
+            "user": turn.user,
+            "reply": " ".join(events.replies),
+            "tools": events.tools,
+            "stt_ms": (events.transcribed_at - start) * 1000,
+            "agent_ms": (end - events.transcribed_at) * 1000,
+            "tts_first_audio_ms": first_audio[0] * 1000 if first_audio else 0.0,
+            "first_audio_ms": (first_frames[0] - start) * 1000 if first_frames else 0.0,
+            "total_ms": (end - start) * 1000,
+            "stages_ms": {
+                stage: sum(durations) * 1000 for stage, durations in stages.items()
+            },
+            "llm_requests": fakes.llm.requests - llm_requests,
+            "db_queries": sum(db_queries.values()),
+            "db_queries_by_function": dict(db_queries),
+            "metadata_updates": fakes.room.updates - metadata_updates,
+            "text_packets": self.text_stream.writes - text_packets,
+            "unused_llm_responses": fakes.llm.unused,
+            "unscripted_llm_requests": fakes.llm.unscripted - unscripted,
+        }
+
+
+def _summary(turns: list[dict[str, Any]]) -> dict[str, Any]:
+    stages: defaultdict[str, list[float]] = defaultdict(list)
+    for turn in turns:
+        for stage, ms in turn["stages_ms"].items():
+            stages[stage].append(ms)
+    return {
+        "turns": len(turns),
+        **{metric: summarize([turn[metric] for turn in turns]) for metric in LATENCIES},
+        "stages_ms": {stage: summarize(samples) for stage, samples in stages.items()},
+        **{metric: sum(turn[metric] for turn in turns) for metric in CALLS},
+    }
+
+
+def regressions(
+    summary: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Compare a summary to that of a previous report (see the module docstring)."""
+    found = []
+    for metric in CALLS:
+        if metric in baseline and summary[metric] > baseline[metric]:
+            found.append(f"{metric}: {baseline[metric]} -> {summary[metric]}")
+    for metric in LATENCIES:
+        before = baseline.get(metric, {}).get("mean")
+        after = summary[metric].get("mean")
+        if before and after and after > before * (1 + tolerance):
+            found.append(f"{metric} (mean): {before:.1f} -> {after:.1f}")
+    return found
+
+
+async def replay(sessions: list[Session], fakes: Fakes, settle: float) -> list[dict]:
+    await db.init_pool()
+    await db.task_changes.start()
+    try:
+        turns = []
+        for session in sessions:
+            turns += await _Replay(session, fakes, settle).run()
+        return turns
+    finally:
+        await db.task_changes.stop()
+        await db.close_pool()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", default=SESSIONS)
+    parser.add_argument("--stt-delay", type=float, default=0.15)
+    parser.add_argument("--llm-ttft", type=float, default=0.4)
+    parser.add_argument("--llm-token-interval", type=float, default=0.02)
+    parser.add_argument("--tts-ttfb", type=float, default=0.12)
+    parser.add_argument("--room-delay", type=float, default=0.03)
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=0.1,
+        help="Seconds to wait after each turn for its task changes to be published.",
+    )
+    parser.add_argument("--baseline", help="A previous report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fakes = Fakes(
+        stt=FakeSTT(args.stt_delay),
+        llm=FakeLLM(args.llm_ttft, args.llm_token_interval),
+        tts=FakeTTS(args.tts_ttfb),
+        room=FakeRoomService(args.room_delay),
+    )
+    turns = asyncio.run(replay(load_sessions(args.sessions), fakes, args.settle))
+    report: dict[str, Any] = {
+        "commit": git_commit(),
+        "config": {
+            **{
+                name: value
+                for name, value in vars(args).items()
+                if name not in ("baseline", "tolerance")
+            },
+            "INTENT_FAST_PATH": os.environ.get("INTENT_FAST_PATH", "1"),
+            "TEMPLATED_CONFIRMATIONS": os.environ.get("TEMPLATED_CONFIRMATIONS", "1"),
+        },
+        "summary": _summary(turns),
+        "turns": turns,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["summary"]
+        report["regressions"] = regressions(report["summary"], baseline, args.tolerance)
+    print(json.dumps(report, indent=2))
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Measure job start latency in a prewarmed job process vs. an unprewarmed one.
+
+The worker runs each job in its own process (the process executor), so both are measured
+in fresh processes. A job start is `WorkerResources.acquire` plus a first query from the
+pool, which is what the entrypoint waits for before it can load the user's tasks.
+
+- cold: the process was not prewarmed, so the job loads the VAD model and opens the
+  database pool, the task change listener and the LiveKit API client itself.
+- prewarmed: `WorkerResources.prewarm` ran first (in production, while the process idled
+  before getting a job; its duration is reported as `prewarm`), and the job is then run on
+  a new event loop, as livekit's job process does.
+
+Run from the agent directory: `python -m benchmarks.startup --iterations 5`
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from benchmarks.stats import summarize
+
+# LiveKitAPI only validates its settings on construction; it does not connect.
+os.environ.setdefault("LIVEKIT_URL", "ws://localhost:7880")
+os.environ.setdefault("LIVEKIT_API_KEY", "devkey")
+os.environ.setdefault("LIVEKIT_API_SECRET", "secret")
+
+
+@dataclass
+class _Proc:
+    executor_type: Any
+    userdata: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _JobContext:
+    """The parts of agents.JobContext that WorkerResources.acquire uses."""
+
+    proc: _Proc
+
+
+def _job_process(queue: mp.Queue, prewarm: bool) -> None:
+    from livekit.agents import JobExecutorType
+
+    import db
+    from resources import resources
+
+    proc = _Proc(JobExecutorType.PROCESS)
+    prewarm_ms = None
+    if prewarm:
+        start = time.perf_counter()
+        resources.prewarm(proc)  # type: ignore[arg-type]
+        prewarm_ms = (time.perf_counter() - start) * 1000
+
+    async def job() -> float:
+        start = time.perf_counter()
+        await resources.acquire(_JobContext(proc=proc))  # type: ignore[arg-type]
+        async with db.pool.connection() as conn:
+            await conn.execute("SELECT 1")
+        elapsed = (time.perf_counter() - start) * 1000
+        await resources.release()
+        return elapsed
+
+    # What livekit's job process does once it gets a job.
+    loop = asyncio.new_event_loop()
+    try:
+        queue.put((prewarm_ms, loop.run_until_complete(job())))
+    finally:
+        loop.close()
+
+
+def _run(iterations: int, prewarm: bool) -> tuple[list[float], list[float]]:
+    ctx = mp.get_context("spawn")
+    prewarms, starts = [], []
+    for _ in range(iterations):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_job_process, args=(queue, prewarm))
+        proc.start()
+        prewarm_ms, start_ms = queue.get()
+        proc.join()
+        if prewarm_ms is not None:
+            prewarms.append(prewarm_ms)
+        starts.append(start_ms)
+    return prewarms, starts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    _, cold = _run(args.iterations, prewarm=False)
+    prewarm, prewarmed = _run(args.iterations, prewarm=True)
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "startup",
+                "unit": "ms",
+                "executor": "process",
+                "cold_job_start": summarize(cold),
+                "prewarmed_job_start": summarize(prewarmed),
+                "prewarm": summarize(prewarm),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
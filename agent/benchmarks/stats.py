@@ -0,0 +1,39 @@
+import statistics
+import subprocess
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `samples` (which does not need to be sorted)."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Summarize latency samples (in milliseconds) for a machine-readable report."""
+    if not samples:
+        return {"n": 0}
+    return {
+        "n": len(samples),
+        "mean": statistics.fmean(samples),
+        "min": min(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+
+def git_commit() -> str | None:
+    """The short hash of the checked-out commit, to tell reports apart."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,152 @@
+"""Compare the cost of task rows as pydantic models (as they used to be read) and as `Task`s.
+
+For batches of 1k rows, as returned by `GET_TASKS`, the report has the time to build the
+rows with each row factory, to encode them as the prompt's task table and as the JSON sent
+to the webapp, and the memory held by the built rows (and allocated while building them).
+
+Run from the agent directory: `python -m benchmarks.task_rows`
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, ClassVar, Optional
+
+from pydantic import BaseModel
+
+from benchmarks.stats import git_commit, summarize
+from db import Task, task_row
+from prompt_builder import TASK_TABLE_HEADER, _cell, task_table
+from utils import DateTimeEncoder
+
+COLUMNS = ("name", "description", "deadline", "is_complete")
+
+
+class PydanticTask(BaseModel):
+    """The former definition of `db.Task`."""
+
+    name: str
+    is_complete: bool
+    deadline: Optional[datetime]
+    description: Optional[str]
+
+
+def _pydantic_task_table(tasks: list[PydanticTask]) -> str:
+    """The former prompt encoding, by attribute."""
+    return "\n".join(
+        [
+            TASK_TABLE_HEADER,
+            *(
+                " | ".join(
+                    (
+                        _cell(task.name),
+                        "yes" if task.is_complete else "no",
+                        task.deadline.strftime("%a %Y-%m-%d %H:%M")
+                        if task.deadline
+                        else "-",
+                        _cell(task.description) if task.description else "-",
+                    )
+                )
+                for task in tasks
+            ),
+        ]
+    )
+
+
+class _Column:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class _Cursor:
+    """The part of a psycopg cursor that row factories use."""
+
+    description: ClassVar[list[_Column]] = [_Column(name) for name in COLUMNS]
+
+
+def _rows(count: int) -> list[tuple[Any, ...]]:
+    start = datetime(2026, 10, 16, 9, 0)
+    return [
+        (
+            f"Task number {i}",
+            f"The description of task {i}." if i % 2 else None,
+            start + timedelta(hours=i) if i % 3 else None,
+            i % 4 == 0,
+        )
+        for i in range(count)
+    ]
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def _memory(build: Callable[[], list]) -> dict[str, int]:
+    tracemalloc.start()
+    try:
+        rows = build()
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del rows
+    return {"held_bytes": held, "peak_bytes": peak}
+
+
+def _measure(
+    make: Callable[[tuple], Any],
+    rows: list[tuple[Any, ...]],
+    to_prompt: Callable[[list], str],
+    to_json: Callable[[Any], dict[str, Any]],
+    repeat: int,
+) -> dict[str, Any]:
+    tasks = [make(row) for row in rows]
+    return {
+        "build_ms": _time(lambda: [make(row) for row in rows], repeat),
+        "prompt_ms": _time(lambda: to_prompt(tasks), repeat),
+        "json_ms": _time(
+            lambda: json.dumps([to_json(task) for task in tasks], cls=DateTimeEncoder),
+            repeat,
+        ),
+        **_memory(lambda: [make(row) for row in rows]),
+    }
+
+
+def run(count: int, repeat: int) -> dict[str, Any]:
+    rows = _rows(count)
+    makers = {
+        # What psycopg's class_row(PydanticTask) does per row.
+        "pydantic": lambda values: PydanticTask(**dict(zip(COLUMNS, values))),
+        "task": task_row(_Cursor()),
+    }
+    to_prompt: dict[str, Callable[[list], str]] = {
+        "pydantic": _pydantic_task_table,
+        "task": task_table,
+    }
+    to_json: dict[str, Callable[[Any], dict[str, Any]]] = {
+        "pydantic": lambda task: task.model_dump(),
+        "task": Task.as_json,
+    }
+
+    report: dict[str, Any] = {"commit": git_commit(), "rows": count}
+    for kind, make in makers.items():
+        report[kind] = _measure(make, rows, to_prompt[kind], to_json[kind], repeat)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
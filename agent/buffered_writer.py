@@ -0,0 +1,127 @@
+import asyncio
+from collections import deque
+import logging
+from typing import Any, Optional, Protocol
+
+from tracing import span
+
+logger = logging.getLogger("Agent")
+
+SENTENCE_ENDINGS = (".", "!", "?", "\n")
+
+
+class TextWriter(Protocol):
+    async def write(self, text: str) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class BufferedTextWriter:
+    """Buffers text written to a text stream so that it is sent in a few larger packets.
+
+    `write` never blocks. Text is buffered until it ends a sentence, reaches `max_chars`, or
+    has waited `flush_interval` seconds, and is then queued for a background task that
+    sends it. If `max_pending` chunks are already queued (i.e. the client is slow), new text
+    is merged into the last queued chunk instead of waiting for room in the queue.
+    """
+
+    def __init__(
+        self,
+        writer: TextWriter,
+        max_chars: int = 200,
+        flush_interval: float = 0.15,
+        max_pending: int = 16,
+    ) -> None:
+        self.writer = writer
+        self.max_chars = max_chars
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._buffer: list[str] = []
+        self._buffered_chars = 0
+        self._pending: deque[str] = deque()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.packets_sent = 0
+        self.chunks_coalesced = 0
+
+    @property
+    def info(self) -> Any:
+        return getattr(self.writer, "info", None)
+
+    def write(self, text: str) -> None:
+        """Buffer `text` for the stream. Never blocks."""
+        if self._closed or not text:
+            return
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if self._buffered_chars >= self.max_chars or text.rstrip(" ").endswith(
+            SENTENCE_ENDINGS
+        ):
+            self.flush_nowait()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self.flush_nowait
+            )
+
+    def flush_nowait(self) -> None:
+        """Queue the buffered text for sending without waiting for it to be sent."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+
+        chunk = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_chars = 0
+        if len(self._pending) >= self.max_pending:
+            self._pending[-1] += chunk
+            self.chunks_coalesced += 1
+        else:
+            self._pending.append(chunk)
+
+        self._drained.clear()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="buffered-text-writer")
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                chunk = self._pending.popleft()
+                try:
+                    with span("text_stream.write", chars=len(chunk)):
+                        await self.writer.write(chunk)
+                    self.packets_sent += 1
+                except Exception as ex:
+                    logger.error(
+                        "Failed to write to the text stream. Dropped %d chars. Error: %s.",
+                        len(chunk),
+                        ex,
+                    )
+            self._drained.set()
+
+    async def flush(self) -> None:
+        """Send the buffered text and wait until everything queued has been sent."""
+        self.flush_nowait()
+        await self._drained.wait()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        await self.flush()
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.writer.aclose()
@@ -0,0 +1,95 @@
+from livekit.agents import llm
+from livekit.agents.llm.chat_context import ChatMessage, FunctionCallOutput
+
+from prompt_builder import estimate_tokens
+
+# The number of tool outputs kept in the summary of the older turns.
+MAX_SUMMARY_LINES = 20
+
+
+def _item_tokens(item) -> int:
+    if isinstance(item, ChatMessage):
+        return estimate_tokens(item.text_content or "") + 4
+    if isinstance(item, FunctionCallOutput):
+        return estimate_tokens(item.output) + 4
+    return estimate_tokens(getattr(item, "arguments", "")) + 8
+
+
+def _is_instructions(item) -> bool:
+    return isinstance(item, ChatMessage) and item.role in ("system", "developer")
+
+
+class ChatCompactor:
+    """Bounds the chat context sent to the LLM in long sessions.
+
+    The last `keep_turns` turns (a turn starts at a user message) are kept verbatim. The
+    tool calls of the older turns are collapsed into a short summary of their outputs (the
+    instructions already carry the current tasks), and their messages are kept, newest
+    first, while they fit in `token_budget`. The leading instructions are always kept.
+    """
+
+    def __init__(self, keep_turns: int = 6, token_budget: int = 2000) -> None:
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.items_dropped = 0
+
+    def compact(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """Return a compacted copy of `chat_ctx`, or `chat_ctx` itself if it is within bounds."""
+        items = chat_ctx.items
+        leading = 0
+        while leading < len(items) and _is_instructions(items[leading]):
+            leading += 1
+        instructions, history = items[:leading], items[leading:]
+
+        turns: list[list] = []
+        for item in history:
+            if not turns or (isinstance(item, ChatMessage) and item.role == "user"):
+                turns.append([])
+            turns[-1].append(item)
+
+        costs = [sum(_item_tokens(item) for item in turn) for turn in turns]
+        if len(turns) <= self.keep_turns and sum(costs) <= self.token_budget:
+            return chat_ctx
+
+        # The recent turns, dropping the oldest of them if they alone exceed the budget.
+        recent_start = max(0, len(turns) - self.keep_turns)
+        budget = self.token_budget - sum(costs[recent_start:])
+        while budget < 0 and recent_start < len(turns) - 1:
+            budget += costs[recent_start]
+            recent_start += 1
+        older, recent = turns[:recent_start], turns[recent_start:]
+
+        outputs = [
+            item.output if not item.is_error else f"(failed) {item.output}"
+            for turn in older
+            for item in turn
+            if isinstance(item, FunctionCallOutput)
+        ][-MAX_SUMMARY_LINES:]
+        summary_items = []
+        if outputs:
+            summary = (
+                "Summary of the earlier tool results in this conversation (the current tasks are listed in the instructions):\n"
+                + "\n".join(outputs)
+            )
+            summary_items.append(ChatMessage(role="system", content=[summary]))
+            budget -= estimate_tokens(summary) + 4
+
+        kept: list = []
+        for item in reversed([item for turn in older for item in turn]):
+            if not isinstance(item, ChatMessage) or not item.text_content:
+                continue
+            cost = _item_tokens(item)
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append(item)
+        kept.reverse()
+
+        compacted = [
+            *instructions,
+            *summary_items,
+            *kept,
+            *(item for turn in recent for item in turn),
+        ]
+        self.items_dropped += len(items) - len(compacted) + len(summary_items)
+        return llm.ChatContext(compacted)
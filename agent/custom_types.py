@@ -1,5 +1,5 @@
-from typing import Annotated
-from pydantic import Field
+from typing import Annotated, Any, Literal, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
 from pydantic import GetCoreSchemaHandler
 from pydantic_core import core_schema
@@ -54,3 +54,62 @@ class FutureLocalDateTime:
 
 
 FutureDatetime = Annotated[datetime, FutureLocalDateTime]
+
+
+class TaskSpec(BaseModel):
+    """A task to create, as passed to the batch tools."""
+
+    name: TaskName
+    is_complete: Optional[bool] = False
+    deadline: Optional[FutureDatetime] = None
+    description: Optional[TaskDescription] = None
+
+
+class TaskEdit(BaseModel):
+    """An edit to an existing task, as passed to the batch tools."""
+
+    name: TaskName
+    new_name: Optional[TaskName] = None
+    is_complete: Optional[bool] = None
+    new_deadline: FutureDatetime | Literal["No Update"] | None = "No Update"
+    new_description: Optional[TaskDescription] = None
+
+    def updated_fields(self) -> dict[str, Any]:
+        """The columns to update, following the same conventions as the edit_task tool."""
+        updated_fields: dict[str, Any] = {}
+        if self.new_name is not None:
+            updated_fields["name"] = self.new_name
+        if self.is_complete is not None:
+            updated_fields["is_complete"] = self.is_complete
+        if self.new_deadline != "No Update":
+            updated_fields["deadline"] = self.new_deadline
+        if self.new_description is not None:
+            updated_fields["description"] = self.new_description
+        return updated_fields
+
+
+class TaskFilter(BaseModel):
+    """Which tasks to list, as passed to the query tool. Unset fields do not filter."""
+
+    is_complete: Optional[bool] = None
+    due_after: Optional[datetime] = None
+    due_before: Optional[datetime] = None
+    name_prefix: Optional[str] = None
+
+    def conditions(self) -> dict[str, Any]:
+        """The filters to apply (see `queries.TASK_FILTERS`) and their parameters."""
+        conditions = {
+            key: value
+            for key, value in self.model_dump(exclude={"name_prefix"}).items()
+            if value is not None
+        }
+        if self.name_prefix:
+            escaped = (
+                self.name_prefix.strip()
+                .lower()
+                .replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            conditions["name_prefix"] = escaped + "%"
+        return conditions
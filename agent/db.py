@@ -1,54 +1,199 @@
+import asyncio
 from datetime import datetime
-from typing import Dict
+import json
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import AsyncIterator, Dict, Literal, NamedTuple, Protocol
 from typing import Any, Optional
 import logging
 from dotenv import load_dotenv
 import os
 from pydantic import BaseModel, FutureDate
+import queries
 from custom_types import (
     TaskName,
     TaskDescription,
     TaskError,
     TaskAlreadyExistsError,
+    TaskFilter,
+    TaskNotFoundError,
+    TaskSpec,
 )
 
-from psycopg import sql, errors
-from psycopg.rows import class_row
+from psycopg import AsyncConnection, OperationalError, errors
+from psycopg.rows import RowMaker, class_row, no_result
 from psycopg_pool import AsyncConnectionPool
+from tracing import span, traced
+from utils import DATETIME_FORMAT, env_number
 
 logger = logging.getLogger("psycopg")
 
 load_dotenv(".env", verbose=True)
 
-pool = AsyncConnectionPool(conninfo=os.environ.get("DATABASE_URL", ""), open=False)
+
+# Sized per job process, i.e. per session (see resources.py). See pool_metrics() to check
+# these against real concurrency.
+pool = AsyncConnectionPool(
+    conninfo=os.environ.get("DATABASE_URL", ""),
+    open=False,
+    min_size=int(env_number("DB_POOL_MIN_SIZE", 2)),
+    max_size=int(env_number("DB_POOL_MAX_SIZE", 8)),
+    max_idle=env_number("DB_POOL_MAX_IDLE", 600.0),
+    max_lifetime=env_number("DB_POOL_MAX_LIFETIME", 3600.0),
+    timeout=env_number("DB_POOL_TIMEOUT", 10.0),
+    # Checking a connection on every checkout costs a round trip, so it is opt-in. Without
+    # it, a connection that was dropped while idle fails the query that gets it, and the
+    # pool then replaces it.
+    check=AsyncConnectionPool.check_connection
+    if os.environ.get("DB_POOL_CHECK", "0") == "1"
+    else None,
+    name="agent",
+)
 
 
 async def init_pool():
-    await pool.open()
+    """Open the pool. Does nothing if it is already open."""
+    if pool.closed:
+        await pool.open()
+
+
+def pool_metrics() -> dict[str, float]:
+    """Return the pool's health metrics (the request counters are cumulative)."""
+    stats = pool.get_stats()
+    checkouts = stats.get("requests_num", 0)
+    queued = stats.get("requests_queued", 0)
+    wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "size": stats.get("pool_size", 0),
+        "min_size": stats.get("pool_min", 0),
+        "max_size": stats.get("pool_max", 0),
+        "available": stats.get("pool_available", 0),
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": checkouts,
+        "checkouts_queued": queued,
+        "wait_ms_total": wait_ms,
+        "wait_ms_mean": wait_ms / queued if queued else 0.0,
+        "timeouts": stats.get("requests_errors", 0),
+        "connections_opened": stats.get("connections_num", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+    }
+
+
+async def close_pool():
+    if not pool.closed:
+        await pool.close()
 
 
-class Task(BaseModel):
+class Task(NamedTuple):
+    """A task as read from the database.
+
+    A plain (named) tuple rather than a pydantic model: tasks are read, cached and encoded
+    on every turn, and are never validated again once read. Pydantic is kept for the tools'
+    arguments (see custom_types.py).
+    """
+
     name: str
     is_complete: bool
     deadline: Optional[datetime]
     description: Optional[str]
 
+    def as_json(self) -> dict[str, Any]:
+        """The task as sent to the webapp (see types.d.ts)."""
+        return {
+            "name": self.name,
+            "is_complete": self.is_complete,
+            "deadline": self.deadline.strftime(DATETIME_FORMAT)
+            if self.deadline
+            else None,
+            "description": self.description,
+        }
+
 
-# TODO: Create a service that deletes collections starting with a '#' after X minutes of inactivity.
+def task_row(cursor) -> RowMaker[Task]:
+    """Row factory for `Task`, taking the columns of the same names in any order.
 
+    The columns are looked up once per result, not once per row as with `class_row`.
+    """
+    if cursor.description is None:
+        return no_result
+    names = [column.name for column in cursor.description]
+    pick = itemgetter(*(names.index(field) for field in Task._fields))
+    return lambda values: tuple.__new__(Task, pick(values))
 
+
+@traced("db.get_tasks")
 async def get_tasks(user_id: str) -> list[Task]:
     """Fetch all tasks from the database."""
     async with pool.connection() as conn:
-        async with conn.cursor(row_factory=class_row(Task)) as cur:
-            await cur.execute(
-                """SELECT name, description, deadline, is_complete
-                 FROM task WHERE user_id = %s;""",
-                (user_id,),
-            )
-            return await cur.fetchall()  # TODO: optionally yield these
+        async with conn.cursor(row_factory=task_row) as cur:
+            await cur.execute(queries.GET_TASKS, (user_id,), prepare=True)
+            return await cur.fetchall()
+
+
+@dataclass(slots=True)
+class TaskPage:
+    """A page of `query_tasks`. `cursor` fetches the next page, and is None on the last one."""
+
+    tasks: list[Task]
+    cursor: Optional[tuple[Any, ...]]
+
+
+@traced("db.query_tasks")
+async def query_tasks(
+    user_id: str,
+    filter: Optional[TaskFilter] = None,
+    order: Literal["deadline", "name"] = "deadline",
+    limit: int = 50,
+    cursor: Optional[tuple[Any, ...]] = None,
+) -> TaskPage:
+    """Fetch a page of the user's tasks matching `filter`, sorted by `order`.
+
+    Pages are keyset-paginated: pass the `cursor` of a page to fetch the next one. Unlike
+    offsets, this costs the same for every page and does not skip or repeat tasks when
+    tasks are added or removed between pages.
+    """
+    conditions = (filter or TaskFilter()).conditions()
+    query = queries.query_tasks(tuple(conditions), order, cursor is not None)
+    params = (user_id, *conditions.values(), *(cursor or ()), limit + 1)
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, params, prepare=True)
+            rows = await cur.fetchall()
+
+    tasks = [
+        Task(name, done, deadline, description)
+        for _, name, description, deadline, done in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        id, name, _, deadline, _ = rows[limit - 1]
+        next_cursor = (deadline, id) if order == "deadline" else (name,)
+    return TaskPage(tasks, next_cursor)
 
 
+async def iter_tasks(
+    user_id: str,
+    filter: Optional[TaskFilter] = None,
+    order: Literal["deadline", "name"] = "deadline",
+    batch_size: int = 100,
+) -> AsyncIterator[Task]:
+    """Yield the user's tasks matching `filter`, sorted by `order`, as they are received.
+
+    The rows are streamed from one query, `batch_size` at a time, instead of being fetched
+    all at once. The connection is held until the generator is exhausted or closed.
+    """
+    conditions = (filter or TaskFilter()).conditions()
+    query = queries.query_tasks(tuple(conditions), order, False)
+    params = (user_id, *conditions.values(), None)  # LIMIT NULL: no limit.
+    with span("db.iter_tasks"):
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=task_row) as cur:
+                async for task in cur.stream(query, params, size=batch_size):
+                    yield task
+
+
+@traced("db.create_task")
 async def create_task(
     user_id: str,
     name: TaskName,
@@ -61,8 +206,9 @@ async def create_task(
         async with conn.cursor() as cur:
             try:
                 await cur.execute(
-                    """INSERT INTO task (user_id, name, is_complete, deadline, description) VALUES (%s, %s, %s, %s, %s);""",
+                    queries.CREATE_TASK,
                     (user_id, name, is_complete, deadline, description),
+                    prepare=True,
                 )
                 if cur.rowcount != 1:
                     raise Exception(
@@ -70,41 +216,38 @@ async def create_task(
                     )
                 return "Success"
             except errors.UniqueViolation:
-                logging.info(
-                    f"Unique constraint violation by {user_id}, while creating task, with name = ({name})."
+                logger.info(
+                    "Unique constraint violation by %s, while creating task, with name = (%s).",
+                    user_id,
+                    name,
                 )
                 return TaskAlreadyExistsError()
             except Exception as ex:
                 logger.error(
-                    f"An unexpected error occurred while creating a task for user ({user_id}). Task Info: name = ({name}), is_complete = ({is_complete}), deadline = ({deadline}), description = ({description}).\nError Type: {type(ex)}\nError: {ex}\n"
+                    "An unexpected error occurred while creating a task for user (%s). Task Info: name = (%s), is_complete = (%s), deadline = (%s), description = (%s).\nError Type: %s\nError: %s\n",
+                    user_id,
+                    name,
+                    is_complete,
+                    deadline,
+                    description,
+                    type(ex),
+                    ex,
                 )
                 return TaskError()
 
 
+@traced("db.edit_task")
 async def edit_task(user_id: str, name: TaskName, updated_fields: Dict[str, Any]):
     """Edit an existing task by name (case-insensitive)."""
     if not updated_fields:
         return ValueError()
     async with pool.connection() as conn:
-        async with conn.cursor(row_factory=class_row(Task)) as cur:
+        async with conn.cursor(row_factory=task_row) as cur:
             try:
-                set_fragments = [
-                    sql.SQL("{col_name} = %s").format(col_name=sql.Identifier(col))
-                    for col in updated_fields.keys()
-                ]
-                query = sql.SQL(
-                    """
-                    UPDATE task
-                    SET {sets}
-                    WHERE user_id = %s
-                    AND LOWER(name) = LOWER(%s)
-                    RETURNING *;
-                    """
-                ).format(
-                    sets=sql.SQL(", ").join(set_fragments)
-                )  # TODO: consider using citext instead of LOWER stmts
                 await cur.execute(
-                    query, tuple(updated_fields.values()) + (user_id, name)
+                    queries.update_task(tuple(updated_fields.keys())),
+                    tuple(updated_fields.values()) + (user_id, name),
+                    prepare=True,
                 )
                 updated_task = await cur.fetchone()
                 if not updated_task:
@@ -112,27 +255,31 @@ async def edit_task(user_id: str, name: TaskName, updated_fields: Dict[str, Any]
                 return updated_task
             except errors.UniqueViolation:
                 logger.info(
-                    f"Unique constraint violation by user ({user_id}). Error occured while editing the task with name = ({name}). The new name was to be ({updated_fields.get('name')})."
+                    "Unique constraint violation by user (%s). Error occured while editing the task with name = (%s). The new name was to be (%s).",
+                    user_id,
+                    name,
+                    updated_fields.get("name"),
                 )
                 return TaskAlreadyExistsError()
             except Exception as ex:
                 logger.error(
-                    f"An unexpected error occurred while editing a task for user ({user_id}). Task Info: name = ({name}). Other task update info = ({updated_fields}).\nError Type: {type(ex)}.\nError: {ex}.\n"
+                    "An unexpected error occurred while editing a task for user (%s). Task Info: name = (%s). Other task update info = (%s).\nError Type: %s.\nError: %s.\n",
+                    user_id,
+                    name,
+                    updated_fields,
+                    type(ex),
+                    ex,
                 )
                 return TaskError()
 
 
+@traced("db.delete_task")
 async def delete_task(user_id: str, name: TaskName):
     """Delete a task by name (case-insensitive)."""
     async with pool.connection() as conn:
         async with conn.cursor() as cur:
             try:
-                query = """
-                    DELETE FROM task
-                    WHERE user_id = %s
-                    AND LOWER(name) = LOWER(%s);
-                    """
-                await cur.execute(query, (user_id, name))
+                await cur.execute(queries.DELETE_TASK, (user_id, name), prepare=True)
                 if cur.rowcount != 1:
                     raise Exception(
                         f"Row count must equal 1, but rowcount=({cur.rowcount})"
@@ -140,11 +287,170 @@ async def delete_task(user_id: str, name: TaskName):
                 return "Success"
             except Exception as ex:
                 logger.error(
-                    f"An unexpected error occurred while deleting a task for user ({user_id}). Task Info: name = ({name}).\nError Type: {type(ex)}.\nError: {ex}.\n"
+                    "An unexpected error occurred while deleting a task for user (%s). Task Info: name = (%s).\nError Type: %s.\nError: %s.\n",
+                    user_id,
+                    name,
+                    type(ex),
+                    ex,
                 )
                 return TaskError()
 
 
+@traced("db.create_tasks")
+async def create_tasks(user_id: str, tasks: list[TaskSpec]) -> list[str | TaskError]:
+    """Add several tasks in a single transaction. Returns one result per task, in order."""
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                try:
+                    await cur.executemany(
+                        queries.CREATE_TASK_IF_NEW,
+                        [
+                            (
+                                user_id,
+                                task.name,
+                                task.is_complete,
+                                task.deadline,
+                                task.description,
+                            )
+                            for task in tasks
+                        ],
+                        returning=True,
+                    )
+                    results: list[str | TaskError] = []
+                    for _ in tasks:
+                        # A conflicting insert does nothing and so returns no row.
+                        row = await cur.fetchone()
+                        results.append(
+                            "Success" if row is not None else TaskAlreadyExistsError()
+                        )
+                        cur.nextset()
+                    return results
+                except Exception as ex:
+                    logger.error(
+                        "An unexpected error occurred while creating %d tasks for user (%s). Task names = (%s).\nError Type: %s\nError: %s\n",
+                        len(tasks),
+                        user_id,
+                        [task.name for task in tasks],
+                        type(ex),
+                        ex,
+                    )
+                    return [TaskError() for _ in tasks]
+
+
+@traced("db.edit_tasks")
+async def edit_tasks(
+    user_id: str, edits: list[tuple[TaskName, Dict[str, Any]]]
+) -> list[Task | Exception]:
+    """Edit several tasks in a single transaction. Returns one result per edit, in order.
+
+    If no edit renames a task, the UPDATEs are pipelined in a single round trip. Otherwise
+    each edit runs in its own savepoint, so that a failed edit (e.g. a rename onto an
+    existing name) does not undo the others.
+    """
+    if all(
+        updated_fields and "name" not in updated_fields for _, updated_fields in edits
+    ):
+        try:
+            async with pool.connection() as conn:
+                async with conn.transaction():
+                    rows = await queries.execute_pipelined(
+                        conn,
+                        [
+                            (
+                                queries.update_task(tuple(updated_fields.keys())),
+                                tuple(updated_fields.values()) + (user_id, name),
+                            )
+                            for name, updated_fields in edits
+                        ],
+                        row_factory=task_row,
+                    )
+            return [row[0] if row else TaskNotFoundError() for row in rows]
+        except Exception as ex:
+            logger.error(
+                "An unexpected error occurred while editing %d tasks for user (%s). Edits = (%s).\nError Type: %s.\nError: %s.\n",
+                len(edits),
+                user_id,
+                edits,
+                type(ex),
+                ex,
+            )
+            return [TaskError() for _ in edits]
+
+    results: list[Task | Exception] = []
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor(row_factory=task_row) as cur:
+                for name, updated_fields in edits:
+                    if not updated_fields:
+                        results.append(ValueError())
+                        continue
+                    try:
+                        async with conn.transaction():
+                            await cur.execute(
+                                queries.update_task(tuple(updated_fields.keys())),
+                                tuple(updated_fields.values()) + (user_id, name),
+                                prepare=True,
+                            )
+                            updated_task = await cur.fetchone()
+                        results.append(
+                            updated_task
+                            if updated_task is not None
+                            else TaskNotFoundError()
+                        )
+                    except errors.UniqueViolation:
+                        logger.info(
+                            "Unique constraint violation by user (%s). Error occured while editing the task with name = (%s). The new name was to be (%s).",
+                            user_id,
+                            name,
+                            updated_fields.get("name"),
+                        )
+                        results.append(TaskAlreadyExistsError())
+                    except Exception as ex:
+                        logger.error(
+                            "An unexpected error occurred while editing a task for user (%s). Task Info: name = (%s). Other task update info = (%s).\nError Type: %s.\nError: %s.\n",
+                            user_id,
+                            name,
+                            updated_fields,
+                            type(ex),
+                            ex,
+                        )
+                        results.append(TaskError())
+    return results
+
+
+@traced("db.delete_tasks")
+async def delete_tasks(user_id: str, names: list[TaskName]) -> list[str | TaskError]:
+    """Delete several tasks in a single transaction. Returns one result per name, in order."""
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                try:
+                    await cur.executemany(
+                        queries.DELETE_TASK,
+                        [(user_id, name) for name in names],
+                        returning=True,
+                    )
+                    results: list[str | TaskError] = []
+                    for _ in names:
+                        row = await cur.fetchone()
+                        results.append(
+                            "Success" if row is not None else TaskNotFoundError()
+                        )
+                        cur.nextset()
+                    return results
+                except Exception as ex:
+                    logger.error(
+                        "An unexpected error occurred while deleting %d tasks for user (%s). Task names = (%s).\nError Type: %s.\nError: %s.\n",
+                        len(names),
+                        user_id,
+                        names,
+                        type(ex),
+                        ex,
+                    )
+                    return [TaskError() for _ in names]
+
+
 class ModelConfig(BaseModel):
     id: int
     user_id: str
@@ -167,6 +473,7 @@ class AllModelConfig(BaseModel):
     tts_model: Optional[str]
 
 
+@traced("db.getAgentConfig")
 async def getAgentConfig(user_id: str):
     encryption_key = os.environ.get("PG_ENCRYPTION_KEY")
     if not encryption_key:
@@ -177,22 +484,10 @@ async def getAgentConfig(user_id: str):
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=class_row(AllModelConfig)) as cur:
             try:
-                query = """
-                    SELECT stt.provider AS stt_provider, 
-                           task_manager.decrypt_api_key(stt.key, %s) AS stt_key, 
-                           stt.model AS stt_model, 
-                           llm.provider AS llm_provider, 
-                           task_manager.decrypt_api_key(llm.key, %s) AS llm_key, 
-                           llm.model AS llm_model, 
-                           tts.provider AS tts_provider, 
-                           task_manager.decrypt_api_key(tts.key, %s) AS tts_key, 
-                           tts.model AS tts_model
-                    FROM stt JOIN llm ON stt.user_id = llm.user_id 
-                    LEFT JOIN tts ON stt.user_id = tts.user_id 
-                    WHERE stt.user_id = %s;
-                    """
                 await cur.execute(
-                    query, (encryption_key, encryption_key, encryption_key, user_id)
+                    queries.GET_AGENT_CONFIG,
+                    (encryption_key, encryption_key, encryption_key, user_id),
+                    prepare=True,
                 )
                 agent_config = await cur.fetchone()
                 if agent_config is None:
@@ -200,6 +495,184 @@ async def getAgentConfig(user_id: str):
                 return agent_config
             except Exception as ex:
                 logger.error(
-                    f"An unknown exception occurred in getAgentConfig.\nError Type: {type(ex)}.\nError: {ex}.\n"
+                    "An unknown exception occurred in getAgentConfig.\nError Type: %s.\nError: %s.\n",
+                    type(ex),
+                    ex,
                 )
                 raise ex
+
+
+class TaskChange(BaseModel):
+    op: Literal["INSERT", "UPDATE", "DELETE"]
+    user_id: str
+    seq: Optional[int] = None  # None if the task change feed is not installed.
+    name: str
+    old_name: Optional[str] = None
+    task: Optional[Task] = None
+
+
+class TaskChangeFeed(BaseModel):
+    """The result of `get_task_changes_since`.
+
+    `changes` are in seq order, and `last_seq` is the seq of the user's latest change. If
+    `compacted`, the changes after the requested seq are no longer all available, and the
+    client has to refetch the tasks (e.g. with `get_tasks`) instead.
+    """
+
+    changes: list[TaskChange]
+    last_seq: int
+    compacted: bool = False
+
+
+@traced("db.get_task_changes_since")
+async def get_task_changes_since(
+    user_id: str, seq: int, limit: int = 500
+) -> TaskChangeFeed:
+    """Fetch the user's task changes with a seq greater than `seq` (at most `limit` of them).
+
+    See create_task_change_table.sql.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(queries.GET_TASK_CHANGE_SEQ, (user_id,), prepare=True)
+            row = await cur.fetchone()
+        last_seq, compacted_seq = row if row is not None else (0, 0)
+        if seq < compacted_seq:
+            return TaskChangeFeed(changes=[], last_seq=last_seq, compacted=True)
+        if seq >= last_seq:
+            return TaskChangeFeed(changes=[], last_seq=last_seq)
+
+        async with conn.cursor(row_factory=class_row(TaskChange)) as cur:
+            await cur.execute(
+                queries.GET_TASK_CHANGES_SINCE, (user_id, seq, limit), prepare=True
+            )
+            changes = await cur.fetchall()
+    return TaskChangeFeed(changes=changes, last_seq=last_seq)
+
+
+class TaskChangeSubscriber(Protocol):
+    def apply_change(self, change: TaskChange) -> None: ...
+
+    def invalidate(self) -> None: ...
+
+
+class TaskChangeListener:
+    """Listens for task changes (see create_task_notify_trigger.sql) on one dedicated connection.
+
+    Changes are fanned out to every subscriber of the affected user in this process. After
+    the connection drops, the listener reconnects with backoff, re-issues LISTEN and then
+    invalidates every subscriber, since any changes made while disconnected were missed.
+    """
+
+    CHANNEL = "task_changes"
+
+    def __init__(
+        self, conninfo: str, min_backoff: float = 0.5, max_backoff: float = 30.0
+    ) -> None:
+        self.conninfo = conninfo
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._subscribers: dict[str, set[TaskChangeSubscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[AsyncConnection] = None
+        self._listening = asyncio.Event()
+
+    def subscribe(self, user_id: str, subscriber: TaskChangeSubscriber) -> None:
+        self._subscribers.setdefault(user_id, set()).add(subscriber)
+
+    def unsubscribe(self, user_id: str, subscriber: TaskChangeSubscriber) -> None:
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[user_id]
+
+    async def start(self) -> None:
+        """Start listening in the background. Does nothing if already started."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="task-change-listener")
+
+    async def wait_listening(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for LISTEN to be in effect. Returns whether it is."""
+        try:
+            await asyncio.wait_for(self._listening.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            # Every process gets every user's changes: only validate the ones it follows.
+            subscribers = self._subscribers.get(data.get("user_id"))
+            if not subscribers:
+                return
+            change = TaskChange.model_validate(data)
+        except Exception as ex:
+            logger.error(
+                "Failed to parse a task change notification.\nPayload: %s.\nError: %s.\n",
+                payload,
+                ex,
+            )
+            return
+        for subscriber in list(subscribers):
+            try:
+                subscriber.apply_change(change)
+            except Exception:
+                logger.exception(
+                    "A subscriber failed to apply a task change (%s).", change.name
+                )
+
+    def _resync(self) -> None:
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                try:
+                    subscriber.invalidate()
+                except Exception:
+                    logger.exception("A subscriber failed to invalidate its tasks.")
+
+    async def _run(self) -> None:
+        backoff = self.min_backoff
+        while True:
+            try:
+                async with await AsyncConnection.connect(
+                    self.conninfo, autocommit=True
+                ) as conn:
+                    self._conn = conn
+                    await conn.execute(f"LISTEN {self.CHANNEL};")
+                    # Anything that happened before LISTEN took effect was missed.
+                    self._resync()
+                    self._listening.set()
+                    backoff = self.min_backoff
+                    async for notify in conn.notifies():
+                        self._dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except (OperationalError, OSError) as ex:
+                logger.warning(
+                    "Task change listener lost its connection. Reconnecting in %ss.\nError: %s.\n",
+                    backoff,
+                    ex,
+                )
+            except Exception:
+                logger.exception(
+                    "Task change listener failed. Restarting in %ss.", backoff
+                )
+            finally:
+                self._conn = None
+                self._listening.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+task_changes = TaskChangeListener(conninfo=os.environ.get("DATABASE_URL", ""))
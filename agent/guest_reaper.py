@@ -0,0 +1,190 @@
+"""Delete inactive guest users and their rows, in small batches.
+
+Run it on its own (e.g. from cron) with `python guest_reaper.py --once`, or once per worker
+(in its main process, not in the job processes) by setting GUEST_REAPER=1. Concurrent
+reapers do not block each other: each batch locks its guests with SKIP LOCKED.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import timedelta
+import logging
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+from psycopg import AsyncConnection
+
+import queries
+from tracing import span
+from utils import env_number
+
+logger = logging.getLogger("psycopg")
+
+load_dotenv(".env", verbose=True)
+
+
+class GuestReaper:
+    """Deletes the guests that have been inactive for `inactive_for`, with their tasks and
+    model settings.
+
+    Each batch is one short transaction on a dedicated connection (never one of the
+    pool's, which are kept for live sessions): it locks up to `batch_size` inactive guests
+    with `FOR UPDATE SKIP LOCKED` and deletes their rows with pipelined statements. A lock
+    that cannot be taken within `lock_timeout` fails the batch rather than making it wait.
+    Batches are started at most `max_batches_per_second` times per second, and a run ends
+    once a batch finds fewer guests than `batch_size`.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        inactive_for: timedelta = timedelta(days=2),
+        batch_size: int = 100,
+        max_batches_per_second: float = 2.0,
+        interval: float = 3600.0,
+        lock_timeout: str = "500ms",
+    ) -> None:
+        self.conninfo = conninfo
+        self.inactive_for = inactive_for
+        self.batch_size = batch_size
+        self.max_batches_per_second = max_batches_per_second
+        self.interval = interval
+        self.lock_timeout = lock_timeout
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.failed_batches = 0
+        self.rows_reclaimed: Counter[str] = Counter()
+        self.batch_seconds_total = 0.0
+        self.batch_seconds_max = 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            **{f"{table}_rows": count for table, count in self.rows_reclaimed.items()},
+            "batch_ms_mean": self.batch_seconds_total / self.batches * 1000
+            if self.batches
+            else 0.0,
+            "batch_ms_max": self.batch_seconds_max * 1000,
+        }
+
+    async def _reap_batch(self, conn: AsyncConnection) -> int:
+        """Delete one batch of guests. Returns the number of guests deleted."""
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{self.lock_timeout}';")
+            # The deleted tasks are not changes that anyone follows: skip the task change
+            # triggers (see create_task_change_table.sql), which would otherwise log each
+            # of them to the feed that the user's delete cascades away, and notify every
+            # listening process of it.
+            await conn.execute("SET LOCAL task_manager.skip_change_log = on;")
+            cur = await conn.execute(
+                queries.LOCK_INACTIVE_GUESTS,
+                {"inactive_for": self.inactive_for, "limit": self.batch_size},
+                prepare=True,
+            )
+            user_ids = [row[0] for row in await cur.fetchall()]
+            if not user_ids:
+                return 0
+
+            cursors = []
+            async with conn.pipeline():
+                for table, statement in queries.DELETE_GUEST_ROWS:
+                    cursors.append(
+                        (
+                            table,
+                            await conn.execute(statement, (user_ids,), prepare=True),
+                        )
+                    )
+        for table, cur in cursors:
+            self.rows_reclaimed[table] += cur.rowcount
+        return len(user_ids)
+
+    async def run_once(self) -> int:
+        """Delete every inactive guest, batch by batch. Returns the number deleted."""
+        reaped = 0
+        min_batch_seconds = 1 / self.max_batches_per_second
+        async with await AsyncConnection.connect(self.conninfo) as conn:
+            while True:
+                start = time.perf_counter()
+                try:
+                    with span("guest_reaper.batch"):
+                        count = await self._reap_batch(conn)
+                except Exception as ex:
+                    self.failed_batches += 1
+                    logger.warning(
+                        "A batch of the guest reaper failed. Ending this run.\nError: %s.\n",
+                        ex,
+                    )
+                    break
+                elapsed = time.perf_counter() - start
+                self.batches += 1
+                self.batch_seconds_total += elapsed
+                self.batch_seconds_max = max(self.batch_seconds_max, elapsed)
+                reaped += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(max(0.0, min_batch_seconds - elapsed))
+
+        logger.info(
+            "Guest reaper deleted %d inactive guests. Stats: %s.", reaped, self.stats()
+        )
+        return reaped
+
+    async def _run(self) -> None:
+        while True:
+            # Sleep first, so that a restarting worker does not reap right away.
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.error("The guest reaper failed to run.\nError: %s.\n", ex)
+
+    async def start(self) -> None:
+        """Run in the background every `interval` seconds, starting `interval` seconds from
+        now. Does nothing if already started."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="guest-reaper")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+guest_reaper = GuestReaper(
+    conninfo=os.environ.get("DATABASE_URL", ""),
+    inactive_for=timedelta(hours=env_number("GUEST_REAPER_INACTIVE_HOURS", 48)),
+    batch_size=int(env_number("GUEST_REAPER_BATCH_SIZE", 100)),
+    max_batches_per_second=env_number("GUEST_REAPER_MAX_BATCHES_PER_SECOND", 2),
+    interval=env_number("GUEST_REAPER_INTERVAL", 3600),
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--once", action="store_true", help="Run once instead of every interval."
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run() -> None:
+        if args.once:
+            await guest_reaper.run_once()
+        else:
+            await guest_reaper._run()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
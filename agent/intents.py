@@ -0,0 +1,282 @@
+"""A deterministic parser for simple task commands, used to answer them without the LLM.
+
+Only short, unambiguous commands are recognized ("mark X as done", "delete X", "add X due
+Friday at 5pm", "create a task called X", ...). Anything else, including commands about
+several tasks, edits other than completing a task, questions, and deadlines that are not
+clearly stated, is left to the LLM.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+import logging
+import re
+import string
+from typing import Literal, Optional
+
+from replies import reply_for
+from task_actions import TaskActions
+from task_cache import TaskCache
+
+logger = logging.getLogger("Agent")
+
+Action = Literal["create", "complete", "uncomplete", "delete"]
+
+MAX_NAME_LENGTH = 38
+
+_FILLER = re.compile(
+    r"^(?:(?:ok(?:ay)?|hey|so|um+|uh+|please|can you|could you|would you|will you)[ ,]+)+"
+)
+_TRAILING_FILLER = re.compile(r"(?:[ ,]+(?:please|thanks|thank you))+$")
+_TASK = r"(?:the )?(?:task )?"
+
+_PATTERNS: list[tuple[Action, re.Pattern]] = [
+    (
+        "uncomplete",
+        re.compile(
+            rf"^(?:mark|set) {_TASK}(?P<name>.+?) (?:as )?(?:not done|not complete|not completed|incomplete|unfinished|undone)$"
+        ),
+    ),
+    ("uncomplete", re.compile(rf"^(?:uncheck|reopen) {_TASK}(?P<name>.+)$")),
+    (
+        "complete",
+        re.compile(
+            rf"^(?:mark|set) {_TASK}(?P<name>.+?) (?:as )?(?:done|complete|completed|finished)$"
+        ),
+    ),
+    (
+        "complete",
+        re.compile(rf"^(?:complete|finish|check off|tick off) {_TASK}(?P<name>.+)$"),
+    ),
+    (
+        "complete",
+        re.compile(
+            rf"^i(?:'ve| have)? (?:finished|completed|done) {_TASK}(?P<name>.+)$"
+        ),
+    ),
+    (
+        "delete",
+        re.compile(
+            rf"^(?:delete|remove) {_TASK}(?P<name>.+?)(?: task)?(?: from my (?:list|tasks|task list|to-do list|to do list))?$"
+        ),
+    ),
+    (
+        "create",
+        re.compile(
+            r"^(?P<verb>add|create|make)(?: a)?(?: new)? (?:(?P<task>task )(?:(?:called|named|to) )?)?(?P<name>.+?)"
+            r"(?: to my (?:list|tasks|task list|to-do list|to do list))?(?: (?:due|by) (?P<due>.+))?$"
+        ),
+    ),
+]
+
+# Names that refer to something other than a single, named task.
+_VAGUE_NAMES = frozenset(
+    {
+        "it",
+        "that",
+        "this",
+        "them",
+        "those",
+        "these",
+        "all",
+        "everything",
+        "task",
+        "a task",
+        "tasks",
+        "all tasks",
+        "all my tasks",
+        "my tasks",
+        "reminder",
+        "a reminder",
+    }
+)
+_MULTIPLE = re.compile(r",| and | & | then | also ")
+# Words that make "add ..." an edit of an existing task ("add a description to groceries")
+# or not about a task at all ("make sure I ..."), rather than a new task's name.
+_NOT_A_NEW_TASK = re.compile(r"\b(?:description|deadline|due|notes?|sure)\b")
+_QUESTION = re.compile(
+    r"^(?:what|which|when|how|do|does|did|is|are|can i|should|why|where|who)\b"
+)
+
+_WEEKDAYS = {
+    name: i
+    for i, name in enumerate(
+        ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    )
+}
+_DAY = re.compile(
+    r"^(?:(?P<today>today)|(?P<tonight>tonight)|(?P<tomorrow>tomorrow)|(?:(?P<next>next|this) )?(?P<weekday>monday|tuesday|wednesday|thursday|friday|saturday|sunday))"
+    r"(?: (?:at )?(?P<time>.+))?$"
+)
+_TIME = re.compile(
+    r"^(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))? ?(?P<meridiem>a\.?m\.?|p\.?m\.?)?$"
+)
+
+END_OF_DAY = time(23, 59)
+TONIGHT = time(21, 0)
+
+
+@dataclass
+class Intent:
+    action: Action
+    name: str
+    deadline: Optional[datetime] = None
+
+
+def _parse_time(text: str) -> Optional[time]:
+    if text in ("noon", "midday"):
+        return time(12, 0)
+    match = _TIME.match(text)
+    if match is None:
+        return None
+    hour, minute = int(match["hour"]), int(match["minute"] or 0)
+    meridiem = (match["meridiem"] or "").replace(".", "")
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    elif match["minute"] is None and hour < 13:
+        return None  # e.g. "at 5": morning or evening?
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def parse_deadline(text: str, now: datetime) -> Optional[datetime]:
+    """Parse a spoken deadline such as "tomorrow", "friday at 5pm" or "next monday at 09:30".
+
+    A day without a time means the end of that day. The deadline has the time zone of `now`.
+    Returns None if the deadline is not clearly stated or is not in the future.
+    """
+    match = _DAY.match(text)
+    if match is None:
+        return None
+
+    if match["today"] or match["tonight"]:
+        day = now.date()
+    elif match["tomorrow"]:
+        day = now.date() + timedelta(days=1)
+    else:
+        ahead = (_WEEKDAYS[match["weekday"]] - now.weekday()) % 7
+        if match["next"] == "next" and ahead == 0:
+            ahead = 7
+        day = now.date() + timedelta(days=ahead)
+
+    if match["time"] is not None:
+        at = _parse_time(match["time"])
+        if at is None:
+            return None
+    else:
+        at = TONIGHT if match["tonight"] else END_OF_DAY
+
+    deadline = datetime.combine(day, at, tzinfo=now.tzinfo)
+    if deadline <= now:
+        if match["weekday"] and not match["next"]:
+            deadline += timedelta(days=7)  # e.g. "friday" said on a Friday evening
+        else:
+            return None
+    return deadline
+
+
+def _clean(text: str) -> str:
+    text = text.strip().lower().rstrip(".!")
+    text = re.sub(r"\s+", " ", text)
+    text = _FILLER.sub("", text)
+    return _TRAILING_FILLER.sub("", text)
+
+
+def parse_intent(text: str, now: Optional[datetime] = None) -> Optional[Intent]:
+    """Return the intent of a simple command, or None if the utterance is not one."""
+    cleaned = _clean(text)
+    if not cleaned or "?" in cleaned or _QUESTION.match(cleaned):
+        return None
+
+    for action, pattern in _PATTERNS:
+        match = pattern.match(cleaned)
+        if match is None:
+            continue
+
+        name = match["name"].strip(" '\"")
+        if (
+            not name
+            or len(name) > MAX_NAME_LENGTH
+            or name in _VAGUE_NAMES
+            or _MULTIPLE.search(name)
+        ):
+            return None
+
+        deadline = None
+        if action == "create":
+            # Without "task", only "add/create X" is a new task, and not "add X to Y"
+            # ("add eggs to my shopping list", "add 30 minutes to laundry").
+            if _NOT_A_NEW_TASK.search(name) or (
+                match["task"] is None and (match["verb"] == "make" or " to " in name)
+            ):
+                return None
+            if match["due"] is not None:
+                deadline = parse_deadline(
+                    match["due"], now or datetime.now().astimezone()
+                )
+                if deadline is None:
+                    return None
+            name = string.capwords(name)
+        return Intent(action, name, deadline)
+
+    return None
+
+
+class IntentRouter:
+    """Answers simple commands directly (with `TaskActions` and a templated reply).
+
+    `handle` returns None when the LLM should handle the utterance: when it is not a simple
+    command, or when it names a task that cannot be resolved with confidence. `hits` and
+    `misses` count the utterances answered here and the ones passed on to the LLM.
+    """
+
+    def __init__(self, task_cache: TaskCache, actions: TaskActions) -> None:
+        self.task_cache = task_cache
+        self.actions = actions
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    async def handle(self, text: str) -> Optional[str]:
+        reply = await self._handle(text)
+        if reply is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return reply
+
+    async def _handle(self, text: str) -> Optional[str]:
+        intent = parse_intent(text)
+        if intent is None:
+            return None
+
+        if intent.action == "create":
+            result = await self.actions.create_task(
+                intent.name, deadline=intent.deadline
+            )
+        else:
+            name = self.task_cache.resolve_name(intent.name).name
+            if name is None:
+                return None
+            if intent.action == "delete":
+                result = await self.actions.delete_task(name)
+            else:
+                result = await self.actions.edit_task(
+                    name, {"is_complete": intent.action == "complete"}
+                )
+
+        logger.info(
+            "Answered a '%s' command without the LLM. Outcome = (%s).",
+            intent.action,
+            result.outcome,
+        )
+        return reply_for(intent.action, result) or result.message
@@ -0,0 +1,127 @@
+"""Moves log I/O off the event loop.
+
+`install` replaces the root logger's handlers (set up by the LiveKit CLI: stdout in the
+worker, the IPC queue in a job process) with a QueueHandler, and runs the original handlers
+on a QueueListener thread. Records are enqueued unformatted, so messages are only
+formatted (on the listener thread) if they are emitted.
+
+Records also get the fields set with `log_fields` (e.g. user_id, room, tool) as attributes,
+which the LiveKit formatters print as structured fields. INFO and DEBUG records can be
+sampled per logger with the AGENT_LOG_SAMPLING environment variable, e.g.
+"psycopg=0.1,Agent=0.5" keeps 1 in 10 and 1 in 2 of each (logger, message) pair.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Any, Iterator, Optional
+
+_fields: ContextVar[dict[str, Any]] = ContextVar("log_fields", default={})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handlers: list[logging.Handler] = []
+
+
+@contextmanager
+def log_fields(**fields: Any) -> Iterator[None]:
+    """Add `fields` to the records logged in this context (and the tasks it creates)."""
+    token = _fields.set({**_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def set_log_fields(**fields: Any) -> None:
+    """Add `fields` to the records logged for the rest of the current context."""
+    _fields.set({**_fields.get(), **fields})
+
+
+class ContextFieldsFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _fields.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in every round(1 / rate) INFO and DEBUG records of each (logger, message).
+
+    The first record of each message is always kept. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.every = {name: max(1, round(1 / rate)) for name, rate in rates.items()}
+        self._counts: dict[tuple[str, Any], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = self.every.get(record.name)
+        if every is None or every == 1:
+            return True
+        key = (record.name, record.msg)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % every == 0
+
+
+class _UnformattedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener's handlers format the record, on the listener thread.
+        return record
+
+
+def _sampling_rates() -> dict[str, float]:
+    rates = {}
+    for item in os.environ.get("AGENT_LOG_SAMPLING", "").split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def install() -> None:
+    """Route the root logger's handlers through a background thread. Idempotent."""
+    global _listener, _handlers
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    _handlers = list(root.handlers)
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = _UnformattedQueueHandler(log_queue)
+    rates = _sampling_rates()
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    handler.addFilter(ContextFieldsFilter())
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_handlers, respect_handler_level=True
+    )
+    _listener.start()
+    for original in _handlers:
+        root.removeHandler(original)
+    root.addHandler(handler)
+
+
+def uninstall() -> None:
+    """Flush the queued records and restore the original handlers."""
+    global _listener, _handlers
+    if _listener is None:
+        return
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _UnformattedQueueHandler):
+            root.removeHandler(handler)
+    _listener.stop()
+    for original in _handlers:
+        root.addHandler(original)
+    _listener = None
+    _handlers = []
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Optional, Protocol
+
+from livekit.protocol.room import UpdateRoomMetadataRequest
+
+import db
+from db import TaskChange
+from tracing import span
+from utils import DateTimeEncoder
+
+logger = logging.getLogger("Agent")
+
+
+class RoomService(Protocol):
+    async def update_room_metadata(self, update: UpdateRoomMetadataRequest) -> Any: ...
+
+
+# The most changes sent in one metadata update (the room metadata is limited in size).
+MAX_CHANGES_PER_UPDATE = 50
+
+
+class RoomMetadataPublisher:
+    """Publishes the user's task changes to the room metadata, for the webapp to apply.
+
+    The publisher subscribes to the user's task changes (see `db.task_changes`), which
+    carry their seq in the user's task change feed (see create_task_change_table.sql). Each
+    metadata update is `{"seq", "changes": [{seq, op, name, old_name, task}, ...],
+    "updated_at"}`, where `seq` is that of the last change. A client that sees a first seq
+    further ahead than the last one it applied (e.g. because two metadata updates collapsed
+    into one) fetches the changes in between from the feed.
+
+    `apply_change` only enqueues the change. A background task waits `window` seconds
+    after the first queued change so that bursts are merged into a single request, then
+    sends it and retries with exponential backoff on failure. After the change listener
+    reconnects (`invalidate`), the changes missed in the meantime are read from the feed.
+    """
+
+    def __init__(
+        self,
+        room_service: RoomService,
+        room_name: str,
+        user_id: str,
+        window: float = 0.05,
+        max_retries: int = 5,
+        min_backoff: float = 0.1,
+        max_backoff: float = 2.0,
+    ) -> None:
+        self.room_service = room_service
+        self.room_name = room_name
+        self.user_id = user_id
+        self.window = window
+        self.max_retries = max_retries
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._catch_up_task: Optional[asyncio.Task] = None
+        self.last_seq: Optional[int] = None
+        self.requests_sent = 0
+        self.updates_published = 0
+
+    def publish(self, change: dict[str, Any]) -> None:
+        """Queue a change for publication. Never blocks."""
+        self._queue.put_nowait(change)
+        self.updates_published += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(
+                self._run(), name=f"room-metadata-publisher-{self.room_name}"
+            )
+
+    def apply_change(self, change: TaskChange) -> None:
+        """Publish a change from the task change listener, unless it was already published."""
+        if change.seq is not None:
+            if self.last_seq is not None and change.seq <= self.last_seq:
+                return
+            self.last_seq = change.seq
+        self.publish(
+            {
+                "op": change.op,
+                "seq": change.seq,
+                "name": change.name,
+                "old_name": change.old_name,
+                "task": change.task.as_json() if change.task is not None else None,
+            }
+        )
+
+    def invalidate(self) -> None:
+        """Publish the changes missed while the change listener was disconnected."""
+        if self.last_seq is None:
+            return
+        if self._catch_up_task is None or self._catch_up_task.done():
+            self._catch_up_task = asyncio.create_task(
+                self._catch_up(), name=f"room-metadata-catch-up-{self.room_name}"
+            )
+
+    async def _catch_up(self) -> None:
+        assert self.last_seq is not None
+        try:
+            feed = await db.get_task_changes_since(self.user_id, self.last_seq)
+        except Exception as ex:
+            logger.error(
+                "Failed to read the task changes of user (%s) since seq (%s).\nError: %s.\n",
+                self.user_id,
+                self.last_seq,
+                ex,
+            )
+            return
+        if feed.compacted:
+            # The client has to refetch its tasks; the next change it sees has a gap.
+            self.last_seq = feed.last_seq
+            return
+        for change in feed.changes:
+            self.apply_change(change)
+
+    def _drain(self) -> list[dict[str, Any]]:
+        updates = []
+        while not self._queue.empty():
+            updates.append(self._queue.get_nowait())
+        return updates
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            await asyncio.sleep(self.window)
+            changes = [first, *self._drain()]
+            try:
+                for i in range(0, len(changes), MAX_CHANGES_PER_UPDATE):
+                    await self._send(changes[i : i + MAX_CHANGES_PER_UPDATE])
+            finally:
+                for _ in changes:
+                    self._queue.task_done()
+
+    def _encode(self, changes: list[dict[str, Any]]) -> str:
+        payload = {
+            "seq": changes[-1]["seq"],
+            "changes": changes,
+            "updated_at": time.time(),
+        }
+        return json.dumps(payload, cls=DateTimeEncoder)
+
+    async def _send(self, updates: list[dict[str, Any]]) -> None:
+        try:
+            update = UpdateRoomMetadataRequest(
+                room=self.room_name, metadata=self._encode(updates)
+            )
+        except TypeError as te:
+            logger.error(te)
+            return
+
+        backoff = self.min_backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with span("room.update_metadata", updates=len(updates)):
+                    await self.room_service.update_room_metadata(update=update)
+                self.requests_sent += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                if attempt == self.max_retries:
+                    logger.error(
+                        "Failed to update the metadata of room (%s) after %d attempts. Dropped %d update(s).\nError: %s.\n",
+                        self.room_name,
+                        attempt,
+                        len(updates),
+                        ex,
+                    )
+                    return
+                logger.warning(
+                    "Failed to update the metadata of room (%s). Retrying in %ss.\nError: %s.\n",
+                    self.room_name,
+                    backoff,
+                    ex,
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    async def flush(self) -> None:
+        """Wait until every queued update has been sent (or dropped)."""
+        await self._queue.join()
+
+    async def aclose(self) -> None:
+        if self._catch_up_task is not None:
+            self._catch_up_task.cancel()
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
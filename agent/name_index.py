@@ -0,0 +1,214 @@
+from collections import Counter
+from dataclasses import dataclass, field
+import heapq
+from itertools import chain
+import re
+from typing import Iterable, Optional
+
+STOPWORDS = frozenset({"a", "an", "the", "my", "to", "task"})
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(name: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", name.lower())).strip()
+
+
+def tokens(normalized: str) -> frozenset[str]:
+    return frozenset(t for t in normalized.split(" ") if t and t not in STOPWORDS)
+
+
+def trigrams(normalized: str) -> frozenset[str]:
+    padded = f"  {normalized} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Levenshtein distance, using Myers' bit-parallel algorithm (one pass over `b`)."""
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    mask = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    peq: dict[str, int] = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    pv, mv, distance = mask, 0, len(a)
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return distance
+
+
+def edit_similarity(a: str, b: str) -> float:
+    """1 - (Levenshtein distance / length of the longer string)."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return 1.0 - levenshtein(a, b) / max(len(a), len(b))
+
+
+@dataclass
+class _Entry:
+    name: str
+    normalized: str
+    tokens: frozenset[str]
+    trigrams: frozenset[str]
+
+
+@dataclass
+class NameResolution:
+    """The result of resolving a spoken task name.
+
+    `name` is the canonical task name if the match is confident. Otherwise `candidates`
+    holds the best matches (best first), and is empty if nothing is close.
+    """
+
+    query: str
+    name: Optional[str] = None
+    candidates: list[str] = field(default_factory=list)
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.name is None and bool(self.candidates)
+
+
+class TaskNameIndex:
+    """In-memory index resolving approximate (misheard or misspoken) task names.
+
+    Candidates are found through a trigram inverted index and then scored by trigram
+    overlap, edit distance and shared words, so a lookup only touches names that share at
+    least one trigram with the query.
+    """
+
+    def __init__(
+        self,
+        accept_score: float = 0.6,
+        min_margin: float = 0.15,
+        candidate_score: float = 0.35,
+        max_candidates: int = 3,
+        shortlist_size: int = 5,
+    ) -> None:
+        self.accept_score = accept_score
+        self.min_margin = min_margin
+        self.candidate_score = candidate_score
+        self.max_candidates = max_candidates
+        self.shortlist_size = shortlist_size
+        self._entries: dict[str, _Entry] = {}
+        self._postings: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, name: str) -> None:
+        key = normalize(name)
+        self.remove(name)
+        entry = _Entry(name, key, tokens(key), trigrams(key))
+        self._entries[key] = entry
+        for trigram in entry.trigrams:
+            self._postings.setdefault(trigram, set()).add(key)
+
+    def remove(self, name: str) -> None:
+        entry = self._entries.pop(normalize(name), None)
+        if entry is None:
+            return
+        for trigram in entry.trigrams:
+            keys = self._postings.get(trigram)
+            if keys is not None:
+                keys.discard(entry.normalized)
+                if not keys:
+                    del self._postings[trigram]
+
+    def rebuild(self, names: Iterable[str]) -> None:
+        self._entries = {}
+        self._postings = {}
+        for name in names:
+            self.add(name)
+
+    def _score(
+        self,
+        query: str,
+        query_tokens: frozenset[str],
+        query_trigrams: frozenset[str],
+        entry: _Entry,
+    ) -> float:
+        dice = (
+            2
+            * len(query_trigrams & entry.trigrams)
+            / (len(query_trigrams) + len(entry.trigrams))
+        )
+        token_overlap = (
+            len(query_tokens & entry.tokens) / len(query_tokens | entry.tokens)
+            if query_tokens or entry.tokens
+            else 0.0
+        )
+        return (
+            0.5 * dice
+            + 0.3 * edit_similarity(query, entry.normalized)
+            + 0.2 * token_overlap
+        )
+
+    def resolve(self, name: str) -> NameResolution:
+        query = normalize(name)
+        exact = self._entries.get(query)
+        if exact is not None:
+            return NameResolution(name, name=exact.name)
+
+        query_trigrams = trigrams(query)
+        postings = [self._postings[t] for t in query_trigrams if t in self._postings]
+        if not postings:
+            return NameResolution(name)
+
+        # Trigrams shared by a large share of the names (e.g. a common leading verb) say
+        # little about which name is meant, so they are skipped when generating candidates.
+        common = max(32, len(self._entries) // 20)
+        informative = [keys for keys in postings if len(keys) <= common] or postings
+        shared = Counter(chain.from_iterable(informative))
+
+        # Rank by shared trigrams and only fully score the best few.
+        shortlist = heapq.nlargest(self.shortlist_size, shared, key=shared.__getitem__)
+        query_tokens = tokens(query)
+        scored = sorted(
+            (
+                (
+                    self._score(
+                        query, query_tokens, query_trigrams, self._entries[key]
+                    ),
+                    self._entries[key].name,
+                )
+                for key in shortlist
+            ),
+            reverse=True,
+        )
+
+        best_score, best_name = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        if (
+            best_score >= self.accept_score
+            and best_score - runner_up >= self.min_margin
+        ):
+            return NameResolution(name, name=best_name)
+
+        return NameResolution(
+            name,
+            candidates=[
+                candidate
+                for score, candidate in scored[: self.max_candidates]
+                if score >= self.candidate_score
+            ],
+        )
@@ -0,0 +1,164 @@
+from datetime import datetime
+from typing import Mapping, Optional
+
+from db import Task
+from task_cache import task_key
+
+TASK_TABLE_HEADER = "name | done | deadline | description"
+
+# The number of omitted task names listed in the summary of the tasks over the budget, and
+# the part of the budget set aside for that summary.
+MAX_SUMMARY_NAMES = 20
+SUMMARY_TOKEN_RESERVE = 150
+
+
+def estimate_tokens(text: str) -> int:
+    """A rough token count (about 4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def _cell(value: str) -> str:
+    return value.replace("|", "/").replace("\n", " ")
+
+
+def _encode_task(task: Task) -> str:
+    """Encode a task as a row of the task table."""
+    name, is_complete, deadline, description = task
+    return " | ".join(
+        (
+            _cell(name),
+            "yes" if is_complete else "no",
+            deadline.strftime("%a %Y-%m-%d %H:%M") if deadline else "-",
+            _cell(description) if description else "-",
+        )
+    )
+
+
+def task_table(tasks: list[Task]) -> str:
+    """Encode tasks as the same compact table as in the instructions."""
+    return "\n".join([TASK_TABLE_HEADER, *(_encode_task(task) for task in tasks)])
+
+
+def _rank_key(task: Task, touched: Mapping[str, float]) -> tuple:
+    # Incomplete first, then nearest deadline, then most recently touched.
+    return (
+        task.is_complete,
+        task.deadline is None,
+        task.deadline or datetime.max,
+        -touched.get(task_key(task.name), 0.0),
+    )
+
+
+class InstructionBuilder:
+    """Incrementally builds the agent's instructions from the base prompt, the tasks and the time.
+
+    Tasks are encoded as rows of a compact table. If the table would exceed
+    `task_token_budget`, only the most relevant tasks (incomplete first, then nearest
+    deadline, then most recently touched) are listed, followed by a bounded summary of the
+    others.
+
+    Each task's row is cached and only re-encoded when the task object changes. The task
+    section as a whole is only rebuilt when the task cache's version changes, and `render`
+    returns None when the resulting instructions are identical to the last ones, so that the
+    caller can skip `update_instructions`.
+    """
+
+    def __init__(self, task_token_budget: int = 1500) -> None:
+        self.task_token_budget = task_token_budget
+        self._fragments: dict[str, tuple[Task, str]] = {}
+        self._tasks_version: Optional[int] = None
+        self._task_section = ""
+        self._rendered: Optional[str] = None
+
+    def _encode_rows(self, tasks: list[Task]) -> list[str]:
+        fragments: dict[str, tuple[Task, str]] = {}
+        rows = []
+        for task in tasks:
+            key = task_key(task.name)
+            cached = self._fragments.get(key)
+            if cached is None or cached[0] is not task:
+                cached = (task, _encode_task(task))
+            fragments[key] = cached
+            rows.append(cached[1])
+        self._fragments = fragments
+        return rows
+
+    def _summarize(self, omitted: list[Task]) -> str:
+        incomplete = sum(not task.is_complete for task in omitted)
+        names = ", ".join(task.name for task in omitted[:MAX_SUMMARY_NAMES])
+        more = (
+            f", and {len(omitted) - MAX_SUMMARY_NAMES} more"
+            if len(omitted) > MAX_SUMMARY_NAMES
+            else ""
+        )
+        return (
+            f"{len(omitted)} less relevant tasks are not listed ({incomplete} incomplete, "
+            f"{len(omitted) - incomplete} complete): {names}{more}."
+        )
+
+    def _build_task_section(
+        self, tasks: list[Task], touched: Mapping[str, float]
+    ) -> str:
+        if not tasks:
+            return "\n\nThe user currently has no tasks.\n"
+
+        ranked = sorted(tasks, key=lambda task: _rank_key(task, touched))
+        rows = self._encode_rows(ranked)
+
+        costs = [estimate_tokens(row) + 1 for row in rows]
+        budget = self.task_token_budget - estimate_tokens(TASK_TABLE_HEADER)
+        if sum(costs) > budget:
+            budget -= SUMMARY_TOKEN_RESERVE
+        listed = 0
+        for cost in costs:
+            if cost > budget:
+                break
+            budget -= cost
+            listed += 1
+
+        table = "\n".join([TASK_TABLE_HEADER, *rows[:listed]])
+        summary = (
+            f"\n{self._summarize(ranked[listed:])}" if listed < len(ranked) else ""
+        )
+        return f"\n\nHere are the user's current tasks (deadlines are in local time):\n{table}{summary}\n"
+
+    def task_section(
+        self,
+        tasks: list[Task],
+        tasks_version: int,
+        touched: Mapping[str, float] = {},
+    ) -> str:
+        """Return the task section, rebuilding it only if the tasks have changed."""
+        if tasks_version != self._tasks_version:
+            self._task_section = self._build_task_section(tasks, touched)
+            self._tasks_version = tasks_version
+        return self._task_section
+
+    @staticmethod
+    def datetime_section(now: Optional[datetime] = None) -> str:
+        # Truncated to the minute so that the instructions stay stable between turns.
+        now = (now or datetime.now()).astimezone().replace(second=0, microsecond=0)
+        return f"\n\nLastly, for reference, the current date and time is: {now}. "
+
+    def render(
+        self,
+        base: str,
+        tasks: list[Task],
+        tasks_version: int,
+        now: Optional[datetime] = None,
+        touched: Mapping[str, float] = {},
+    ) -> Optional[str]:
+        """Render the instructions. Returns None if they did not change since the last render.
+
+        `touched` maps lowercased task names to when they were last changed, and is used to
+        rank tasks when they do not all fit in the budget.
+        """
+        rendered = (
+            base
+            + self.task_section(tasks, tasks_version, touched)
+            + self.datetime_section(now)
+        )
+        if rendered == self._rendered:
+            return None
+        self._rendered = rendered
+        return rendered
@@ -0,0 +1,163 @@
+"""The SQL statements used by db.py.
+
+Fixed statements are plain strings, executed with `prepare=True` so that each pooled
+connection parses and plans them once and then reuses the server-side prepared statement.
+The UPDATE used to edit tasks depends on which columns are edited, so it is composed once
+per combination of columns and cached (as a string, so it is prepared like the others).
+The same goes for the SELECT of `db.query_tasks`, per combination of filters and order.
+"""
+
+from functools import lru_cache
+from typing import Any, Sequence
+
+from psycopg import AsyncConnection, sql
+
+GET_TASKS = """SELECT name, description, deadline, is_complete
+    FROM task WHERE user_id = %s;"""
+
+CREATE_TASK = """INSERT INTO task (user_id, name, is_complete, deadline, description) VALUES (%s, %s, %s, %s, %s);"""
+
+# A conflicting insert does nothing and so returns no row, instead of aborting the transaction.
+CREATE_TASK_IF_NEW = """INSERT INTO task (user_id, name, is_complete, deadline, description) VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+    RETURNING name;"""
+
+DELETE_TASK = """
+    DELETE FROM task
+    WHERE user_id = %s
+    AND LOWER(name) = LOWER(%s)
+    RETURNING name;
+    """
+
+# Uses task_userid_incomplete_deadline_idx (see add_indexes.sql).
+GET_TASK_CHANGE_SEQ = (
+    """SELECT last_seq, compacted_seq FROM task_change_seq WHERE user_id = %s;"""
+)
+
+GET_TASK_CHANGES_SINCE = """SELECT op, user_id::text AS user_id, seq, name, old_name, task
+    FROM task_change
+    WHERE user_id = %s AND seq > %s
+    ORDER BY seq
+    LIMIT %s;"""
+
+# Guests whose cookie has long expired (see webapp/middleware.ts) and whose tasks have not
+# changed recently. Rows locked by another transaction (e.g. another reaper) are skipped.
+LOCK_INACTIVE_GUESTS = """SELECT id FROM "user"
+    WHERE is_guest
+    AND created_at < (now() - %(inactive_for)s::interval)::date
+    AND NOT EXISTS (
+        SELECT 1 FROM task_change
+        WHERE task_change.user_id = "user".id
+        AND changed_at > now() - %(inactive_for)s::interval
+    )
+    ORDER BY created_at
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED;"""
+
+# The rows of the locked guests, in an order that satisfies the foreign keys. Deleting a
+# user also deletes its task change feed (ON DELETE CASCADE).
+DELETE_GUEST_ROWS = [
+    (table, f"DELETE FROM {table} WHERE user_id = ANY(%s::uuid[]);")
+    for table in ("task", "stt", "llm", "tts", "google_account")
+] + [("user", """DELETE FROM "user" WHERE id = ANY(%s::uuid[]) AND is_guest;""")]
+
+GET_AGENT_CONFIG = """
+    SELECT stt.provider AS stt_provider,
+           task_manager.decrypt_api_key(stt.key, %s) AS stt_key,
+           stt.model AS stt_model,
+           llm.provider AS llm_provider,
+           task_manager.decrypt_api_key(llm.key, %s) AS llm_key,
+           llm.model AS llm_model,
+           tts.provider AS tts_provider,
+           task_manager.decrypt_api_key(tts.key, %s) AS tts_key,
+           tts.model AS tts_model
+    FROM stt JOIN llm ON stt.user_id = llm.user_id
+    LEFT JOIN tts ON stt.user_id = tts.user_id
+    WHERE stt.user_id = %s;
+    """
+
+
+@lru_cache(maxsize=64)
+def update_task(columns: tuple[str, ...]) -> str:
+    """The UPDATE statement setting `columns` (in order) of the task matching (user_id, name)."""
+    set_fragments = [
+        sql.SQL("{col_name} = %s").format(col_name=sql.Identifier(col))
+        for col in columns
+    ]
+    return (
+        sql.SQL(
+            """
+        UPDATE task
+        SET {sets}
+        WHERE user_id = %s
+        AND LOWER(name) = LOWER(%s)
+        RETURNING *;
+        """
+        )
+        .format(sets=sql.SQL(", ").join(set_fragments))
+        .as_string()
+    )  # TODO: consider using citext instead of LOWER stmts
+
+
+# The filters of `query_tasks`, by name. Each takes one parameter.
+TASK_FILTERS = {
+    "is_complete": "is_complete = %s",
+    "due_after": "deadline >= %s",
+    "due_before": "deadline < %s",
+    "name_prefix": "LOWER(name) LIKE %s",
+}
+
+# The sort key and keyset condition of each order of `query_tasks`. Tasks without a
+# deadline sort last. Lowercased names are unique per user, so they are a keyset by
+# themselves.
+TASK_ORDERS = {
+    "deadline": (
+        "COALESCE(deadline, 'infinity'::timestamp), id",
+        "(COALESCE(deadline, 'infinity'::timestamp), id) > (COALESCE(%s::timestamp, 'infinity'::timestamp), %s)",
+    ),
+    "name": ("LOWER(name)", "LOWER(name) > LOWER(%s)"),
+}
+
+
+@lru_cache(maxsize=128)
+def query_tasks(filters: tuple[str, ...], order: str, after: bool) -> str:
+    """The SELECT of one page of a user's tasks.
+
+    The parameters are the user id, then one per filter in `filters` (in order), then the
+    keyset of the last task of the previous page if `after`, then the page size.
+    """
+    sort_key, keyset = TASK_ORDERS[order]
+    conditions = ["user_id = %s", *(TASK_FILTERS[name] for name in filters)]
+    if after:
+        conditions.append(keyset)
+    return f"""SELECT id, name, description, deadline, is_complete
+    FROM task WHERE {" AND ".join(conditions)}
+    ORDER BY {sort_key}
+    LIMIT %s;"""
+
+
+async def execute_pipelined(
+    conn: AsyncConnection,
+    statements: Sequence[tuple[str, Sequence[Any]]],
+    row_factory: Any = None,
+) -> list[list[Any]]:
+    """Send several statements in one round trip (pipeline mode) and return the rows of each.
+
+    An error in any statement aborts the ones after it, so this is meant for statements that
+    are not expected to fail individually (or whose failure should fail them all).
+    """
+    cursors = []
+    async with conn.pipeline():
+        for query, params in statements:
+            cur = (
+                conn.cursor(row_factory=row_factory)
+                if row_factory is not None
+                else conn.cursor()
+            )
+            await cur.execute(query, params, prepare=True)
+            cursors.append(cur)
+    results = []
+    for cur in cursors:
+        results.append(await cur.fetchall() if cur.description is not None else [])
+        await cur.close()
+    return results
@@ -0,0 +1,198 @@
+import asyncio
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+import db
+from db import Task, TaskChange
+from task_cache import TaskCache, task_key
+from utils import env_number, local_naive
+
+logger = logging.getLogger("Agent")
+
+# Called with the task's name and deadline when a reminder is due.
+RemindCallback = Callable[[str, datetime], Awaitable[None]]
+
+
+class ReminderScheduler:
+    """Reminds the users of this process's sessions of their upcoming deadlines.
+
+    It keeps the reminders of every connected user in a single heap, ordered by when they
+    are due, and arms a single timer for the earliest one. A reminder is due `lead` before
+    the task's deadline.
+
+    The scheduler never polls the database. A user's reminders are seeded from their task
+    cache, which the session has already loaded, and then follow the user's task changes
+    through the process's task change listener (see `db.task_changes`): a task that is
+    created, rescheduled, completed, renamed or deleted has its reminder replaced or
+    cancelled. Cancelled reminders are left in the heap and skipped when they come up. Only
+    when the listener reconnects, and changes may have been missed, are the reminders
+    reseeded from the reloaded task caches.
+    """
+
+    def __init__(self, lead: timedelta = timedelta(minutes=10)) -> None:
+        self.lead = lead
+        self._callbacks: dict[str, RemindCallback] = {}
+        self._task_caches: dict[str, TaskCache] = {}
+        # (remind_at, id, user_id, key), and the current reminder of each (user_id, key).
+        self._heap: list[tuple[datetime, int, str, str]] = []
+        self._reminders: dict[tuple[str, str], tuple[int, str, datetime]] = {}
+        self._ids = itertools.count()
+        self._sent: set[tuple[str, str, datetime]] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at: Optional[datetime] = None
+        self._tasks: set[asyncio.Task] = set()
+        self.reminders_sent = 0
+
+    def __len__(self) -> int:
+        return len(self._reminders)
+
+    async def add_user(
+        self, user_id: str, task_cache: TaskCache, callback: RemindCallback
+    ) -> None:
+        """Start reminding the user (i.e. calling `callback`) of their upcoming deadlines."""
+        tasks = await task_cache.get_tasks()
+        self._callbacks[user_id] = callback
+        self._task_caches[user_id] = task_cache
+        # The cache is up to date with every change published until now, and the changes
+        # after this are applied as they come.
+        db.task_changes.subscribe(user_id, self)
+        self._seed(user_id, tasks)
+
+    def remove_user(self, user_id: str) -> None:
+        self._callbacks.pop(user_id, None)
+        self._task_caches.pop(user_id, None)
+        db.task_changes.unsubscribe(user_id, self)
+        self._drop(user_id)
+        self._sent = {sent for sent in self._sent if sent[0] != user_id}
+
+    def _drop(self, user_id: str) -> None:
+        for key in [key for key in self._reminders if key[0] == user_id]:
+            del self._reminders[key]
+
+    def _seed(self, user_id: str, tasks: Iterable[Task]) -> None:
+        now = datetime.now()
+        for task in tasks:
+            if not task.is_complete and task.deadline is not None:
+                self._schedule(user_id, task.name, task.deadline, now)
+
+    async def _reseed(self) -> None:
+        for user_id, task_cache in list(self._task_caches.items()):
+            try:
+                tasks = await task_cache.get_tasks()
+            except Exception as ex:
+                logger.error(
+                    "Failed to reload the tasks of user (%s) for their reminders.\nError: %s.\n",
+                    user_id,
+                    ex,
+                )
+                continue
+            if self._task_caches.get(user_id) is task_cache:  # Still connected.
+                self._drop(user_id)
+                self._seed(user_id, tasks)
+
+    def _schedule(
+        self,
+        user_id: str,
+        name: str,
+        deadline: datetime,
+        now: Optional[datetime] = None,
+    ) -> None:
+        key = (user_id, task_key(name))
+        deadline = local_naive(deadline)
+        if deadline <= (now or datetime.now()) or (*key, deadline) in self._sent:
+            self._reminders.pop(key, None)
+            return
+        current = self._reminders.get(key)
+        if current is not None and current[1:] == (name, deadline):
+            return
+
+        id = next(self._ids)
+        remind_at = deadline - self.lead
+        self._reminders[key] = (id, name, deadline)
+        heapq.heappush(self._heap, (remind_at, id, *key))
+        if self._timer_at is None or remind_at < self._timer_at:
+            self._arm()
+
+    def apply_change(self, change: TaskChange) -> None:
+        """Update the user's reminders with a change published by the database."""
+        if change.user_id not in self._callbacks:
+            return
+        if change.old_name is not None:
+            self._reminders.pop((change.user_id, task_key(change.old_name)), None)
+        task = change.task
+        if (
+            change.op == "DELETE"
+            or task is None
+            or task.is_complete
+            or task.deadline is None
+        ):
+            self._reminders.pop((change.user_id, task_key(change.name)), None)
+            return
+        self._schedule(change.user_id, task.name, task.deadline)
+
+    def invalidate(self) -> None:
+        """Reseed every user's reminders, since changes may have been missed."""
+        self._track(asyncio.create_task(self._reseed()))
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _is_current(self, id: int, user_id: str, key: str) -> bool:
+        current = self._reminders.get((user_id, key))
+        return current is not None and current[0] == id
+
+    def _arm(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = self._timer_at = None
+        # Skip the cancelled reminders at the top of the heap.
+        while self._heap and not self._is_current(*self._heap[0][1:]):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return
+        self._timer_at = self._heap[0][0]
+        delay = (self._timer_at - datetime.now()).total_seconds()
+        self._timer = asyncio.get_running_loop().call_later(max(delay, 0), self._fire)
+
+    def _fire(self) -> None:
+        self._timer = self._timer_at = None
+        now = datetime.now()
+        while self._heap and self._heap[0][0] <= now:
+            _, id, user_id, key = heapq.heappop(self._heap)
+            if not self._is_current(id, user_id, key):
+                continue
+            _, name, deadline = self._reminders.pop((user_id, key))
+            self._sent.add((user_id, key, deadline))
+            callback = self._callbacks.get(user_id)
+            if callback is None:
+                continue
+            self._track(asyncio.create_task(self._remind(callback, name, deadline)))
+        self._arm()
+
+    async def _remind(
+        self, callback: RemindCallback, name: str, deadline: datetime
+    ) -> None:
+        try:
+            await callback(name, deadline)
+            self.reminders_sent += 1
+        except Exception as ex:
+            logger.error(
+                "Failed to send a reminder for the task (%s).\nError: %s.\n", name, ex
+            )
+
+    async def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = self._timer_at = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+reminders = ReminderScheduler(
+    lead=timedelta(minutes=env_number("REMINDER_LEAD_MINUTES", 10))
+)
@@ -0,0 +1,121 @@
+"""Templated replies to the user for the outcomes of task actions."""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from livekit.agents.llm.chat_context import FunctionCall, FunctionCallOutput
+
+from task_actions import ActionResult
+
+# The number of tool calls whose results are kept for `ToolReplies.reply_for_outputs`.
+MAX_RECORDED_CALLS = 64
+
+# Replies for a successful action, by action.
+_SUCCESS = {
+    "create": "Okay, I added '{name}'{due}.",
+    "complete": "Done. I marked '{name}' as complete.",
+    "uncomplete": "Okay, '{name}' is no longer marked as complete.",
+    "edit": "Okay, I updated '{name}'.",
+    "delete": "Okay, I deleted '{name}'.",
+}
+
+# Replies for several successful actions of the same kind, by action.
+_SUCCESS_MANY = {
+    "create": "Okay, I added {names}.",
+    "edit": "Okay, I updated {names}.",
+    "delete": "Okay, I deleted {names}.",
+}
+
+# Replies for a failed action, by outcome.
+_FAILURE = {
+    "exists": "You already have a task called '{name}'.",
+    "not_found": "I couldn't find a task called '{name}'.",
+    "error": "Sorry, something went wrong while updating '{name}'. Please try again.",
+}
+
+
+def spoken_datetime(value: datetime) -> str:
+    """e.g. "Friday, October 23 at 5:00 PM"."""
+    return f"{value:%A, %B} {value.day} at {value.hour % 12 or 12}:{value:%M %p}"
+
+
+def reminder(name: str, deadline: datetime) -> str:
+    return f"Just a reminder: '{name}' is due {spoken_datetime(deadline)}."
+
+
+def reply_for(action: str, result: ActionResult) -> Optional[str]:
+    """The reply for `result`, or None if the outcome needs the LLM (e.g. an ambiguous name)."""
+    if result.succeeded:
+        template = _SUCCESS.get(action)
+        if template is None:
+            return None
+        deadline = result.task.deadline if result.task is not None else None
+        due = f", due {spoken_datetime(deadline)}" if deadline is not None else ""
+        return template.format(name=result.name, due=due)
+
+    template = _FAILURE.get(result.outcome)
+    return template.format(name=result.name) if template is not None else None
+
+
+def _quoted_list(names: list[str]) -> str:
+    quoted = [f"'{name}'" for name in names]
+    return f"{', '.join(quoted[:-1])} and {quoted[-1]}"
+
+
+def reply_for_all(action: str, results: list[ActionResult]) -> Optional[str]:
+    """The reply for the results of one or more actions, or None if any of them needs the LLM."""
+    if len(results) > 1 and action in _SUCCESS_MANY:
+        if all(result.succeeded for result in results):
+            return _SUCCESS_MANY[action].format(
+                names=_quoted_list([result.name for result in results])
+            )
+
+    replies = [reply_for(action, result) for result in results]
+    if not replies or any(reply is None for reply in replies):
+        return None
+    return " ".join(replies)
+
+
+class ToolReplies:
+    """Templated replies to the tool calls of a turn, used instead of a second LLM generation.
+
+    The tools `record` their results under their call id. Once the tools of a turn have
+    run, `reply_for_outputs` builds the reply from the recorded results, provided that every
+    call of the turn was recorded and has a templated reply. Otherwise it returns None and
+    the LLM answers as usual.
+    """
+
+    def __init__(self) -> None:
+        self._results: OrderedDict[str, tuple[str, list[ActionResult]]] = OrderedDict()
+        self.templated = 0
+        self.generated = 0
+
+    def record(self, call_id: str, action: str, results: list[ActionResult]) -> None:
+        self._results[call_id] = (action, results)
+        while len(self._results) > MAX_RECORDED_CALLS:
+            self._results.popitem(last=False)
+
+    def reply_for_outputs(self, items: list) -> Optional[str]:
+        """The reply for the tool outputs at the end of `items`, or None."""
+        outputs: list[FunctionCallOutput] = []
+        for item in reversed(items):
+            if isinstance(item, FunctionCallOutput):
+                outputs.append(item)
+            elif not isinstance(item, FunctionCall):
+                break
+        outputs.reverse()
+
+        recorded = [self._results.pop(output.call_id, None) for output in outputs]
+        replies = [
+            reply_for_all(*entry) if entry is not None and not output.is_error else None
+            for output, entry in zip(outputs, recorded)
+        ]
+        if not replies or any(reply is None for reply in replies):
+            self.generated += 1
+            return None
+        self.templated += 1
+        return " ".join(replies)
+
+    def stats(self) -> dict[str, int]:
+        return {"templated": self.templated, "generated": self.generated}
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Optional
+
+from livekit import agents, api
+from livekit.agents import JobProcess
+from livekit.plugins import silero
+
+import db
+import log_pipeline
+from reminders import reminders
+
+logger = logging.getLogger("Agent")
+
+# How long prewarm waits for the first database connections. It must leave the VAD load
+# room within livekit's initialize_process_timeout (10 seconds by default).
+PREWARM_TIMEOUT = 5.0
+
+
+class _JobLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """Hands `loop` out as the next new event loop, then creates new ones as usual."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__()
+        self._loop: Optional[asyncio.AbstractEventLoop] = loop
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return super().new_event_loop()
+        return loop
+
+
+class WorkerResources:
+    """Resources that a job process opens before it is given its job.
+
+    The worker runs each job in its own process (JobExecutorType.PROCESS, set in agent.py),
+    which takes a single job and exits when it ends. `prewarm` (passed to
+    `WorkerOptions.prewarm_fnc`) runs in the idle processes that the worker keeps ready:
+    it installs the log pipeline, loads the VAD model and opens the database pool, the task
+    change listener and the LiveKit API client. These are bound to an event loop, and
+    livekit creates the job's loop only after prewarm returns, so they are opened on a loop
+    of prewarm's own that the job is then run on (see `_JobLoopPolicy`). The job's shutdown
+    closes everything.
+
+    If prewarm could not open them (e.g. the database was down), the job opens them
+    itself when it calls `acquire`.
+    """
+
+    def __init__(self) -> None:
+        self.lkapi: Optional[api.LiveKitAPI] = None
+        self._opened = False
+        self._active_jobs = 0
+        self._lock = asyncio.Lock()
+
+    def prewarm(self, proc: JobProcess) -> None:
+        log_pipeline.install()
+        proc.userdata["vad"] = silero.VAD.load()
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._prewarm())
+        except Exception as ex:
+            logger.error(
+                "Failed to prewarm the shared resources. The job will retry.\nError: %s.\n",
+                ex,
+            )
+        asyncio.set_event_loop_policy(_JobLoopPolicy(loop))
+
+    async def _prewarm(self) -> None:
+        async with self._lock:
+            await self._open()
+
+        async def first_connection() -> None:
+            async with db.pool.connection(timeout=PREWARM_TIMEOUT):
+                pass
+
+        # Connect now, rather than on the job's first query. The pool stays open (and keeps
+        # trying) if this times out.
+        await asyncio.gather(
+            first_connection(), db.task_changes.wait_listening(PREWARM_TIMEOUT)
+        )
+
+    async def _open(self) -> None:
+        if self._opened:
+            return
+        log_pipeline.install()
+        await db.init_pool()
+        await db.task_changes.start()
+        self.lkapi = api.LiveKitAPI()
+        self._opened = True
+
+    async def acquire(self, ctx: agents.JobContext) -> api.LiveKitAPI:
+        """Make sure the shared resources are open and register the job as a user of them.
+
+        Every call must be paired with a call to `release` when the job shuts down.
+        """
+        async with self._lock:
+            if not self._opened:
+                logger.warning(
+                    "The shared resources were not prewarmed. Opening them on the job's critical path."
+                )
+                await self._open()
+            self._active_jobs += 1
+
+        if "vad" not in ctx.proc.userdata:  # e.g. prewarm_fnc was not set
+            logger.warning(
+                "VAD was not prewarmed. Loading it on the job's critical path."
+            )
+            ctx.proc.userdata["vad"] = silero.VAD.load()
+
+        assert self.lkapi is not None
+        return self.lkapi
+
+    async def release(self) -> None:
+        async with self._lock:
+            self._active_jobs -= 1
+            logger.info("Database pool metrics: %s.", db.pool_metrics())
+            if self._active_jobs == 0:
+                await self._close()
+
+    async def _close(self) -> None:
+        if not self._opened:
+            return
+        self._opened = False
+        if self.lkapi is not None:
+            await self.lkapi.aclose()
+            self.lkapi = None
+        await reminders.stop()
+        await db.task_changes.stop()
+        await db.close_pool()
+        log_pipeline.uninstall()
+
+
+resources = WorkerResources()
@@ -0,0 +1,338 @@
+from dataclasses import dataclass, field
+import logging
+from typing import Any, Literal, Optional
+
+import db
+from custom_types import (
+    TaskAlreadyExistsError,
+    TaskEdit,
+    TaskError,
+    TaskNotFoundError,
+    TaskSpec,
+)
+from db import Task
+from name_index import NameResolution
+from task_cache import TaskCache, task_key
+from utils import KeyedLock, local_naive
+
+logger = logging.getLogger("Agent")
+
+Outcome = Literal[
+    "created",
+    "edited",
+    "deleted",
+    "exists",
+    "not_found",
+    "no_fields",
+    "ambiguous",
+    "error",
+]
+
+
+@dataclass
+class ActionResult:
+    """The outcome of a task action. `message` is what the tools return to the LLM."""
+
+    outcome: Outcome
+    name: str
+    message: str
+    task: Optional[Task] = None
+    candidates: list[str] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.outcome in ("created", "edited", "deleted")
+
+
+def ambiguous_name_message(resolution: NameResolution) -> str:
+    candidates = "', '".join(resolution.candidates)
+    return f"No task with the name '{resolution.query}' was found. Ask the user which of these tasks they meant: '{candidates}'."
+
+
+def _ambiguous(resolution: NameResolution) -> ActionResult:
+    return ActionResult(
+        "ambiguous",
+        resolution.query,
+        ambiguous_name_message(resolution),
+        candidates=resolution.candidates,
+    )
+
+
+class TaskActions:
+    """The task writes behind the tools, shared with the intent fast path.
+
+    Each action writes to the database and then, if it succeeded, to the task cache (the
+    webapp learns of the change from the task change feed). Task names are first resolved
+    against the cache, so that misheard names map to the intended task.
+
+    The LLM can call several tools in one turn, which run concurrently. Writes to different
+    tasks proceed in parallel, while writes to the same task (including both names of a
+    rename) hold a per-name lock and so run in the order they started.
+    """
+
+    def __init__(self, user_id: str, task_cache: TaskCache) -> None:
+        self.user_id = user_id
+        self.task_cache = task_cache
+        self.locks = KeyedLock()
+
+    def _lock_tasks(self, *names: Optional[str]):
+        return self.locks.hold(*(task_key(name) for name in names if name))
+
+    async def create_task(
+        self,
+        name: str,
+        is_complete: Optional[bool] = False,
+        deadline: Any = None,
+        description: Optional[str] = None,
+    ) -> ActionResult:
+        async with self._lock_tasks(name):
+            result = await db.create_task(
+                self.user_id, name, is_complete, deadline, description
+            )
+
+            # TODO: Create another logger for agent messages
+            if isinstance(result, TaskAlreadyExistsError):
+                return ActionResult(
+                    "exists",
+                    name,
+                    f"Failed to create new a task with the name '{name.strip().lower()}'. A task with that name already exists.",
+                )
+
+            if isinstance(result, TaskError):
+                return ActionResult(
+                    "error",
+                    name,
+                    f"Failed to create new a task with the name '{name.strip().lower()}'. An unknown error occurred.",
+                )
+
+            task = Task(
+                name=name,
+                is_complete=bool(is_complete),
+                deadline=local_naive(deadline) if deadline else None,
+                description=description,
+            )
+            self.task_cache.put(task)
+
+            return ActionResult(
+                "created", name, f"Created a new task: '{name}'.", task=task
+            )
+
+    async def edit_task(
+        self, name: str, updated_fields: dict[str, Any]
+    ) -> ActionResult:
+        resolution = self.task_cache.resolve_name(name)
+        if resolution.ambiguous:
+            return _ambiguous(resolution)
+        name = resolution.name or name
+
+        async with self._lock_tasks(name, updated_fields.get("name")):
+            try:
+                updated_task = await db.edit_task(self.user_id, name, updated_fields)
+
+                if isinstance(updated_task, ValueError):
+                    return ActionResult(
+                        "no_fields",
+                        name,
+                        f"The task with the name '{name}' could not be edited. No fields were specified to be updated.",
+                    )
+
+                if isinstance(updated_task, TaskNotFoundError):
+                    return ActionResult(
+                        "not_found",
+                        name,
+                        f"The task with the name '{name}' was not edited. Either the task could not be found, or the field(s) {"'" + "', '".join([k for k in updated_fields.keys()]) + "'"} did not need to be updated.",
+                    )
+
+                if isinstance(updated_task, TaskError):
+                    return ActionResult(
+                        "error",
+                        name,
+                        f"The task with the name '{name}' could not be edited. An unknown error occured.",
+                    )
+
+                self.task_cache.replace(name, updated_task)
+
+                return ActionResult(
+                    "edited", name, f"Edited the task: '{name}'.", task=updated_task
+                )
+            except Exception as ex:
+                logger.error("Error while editing task, %s.", ex)
+                return ActionResult("error", name, "An unknown error occurred.")
+
+    async def delete_task(self, name: str) -> ActionResult:
+        resolution = self.task_cache.resolve_name(name)
+        if resolution.ambiguous:
+            return _ambiguous(resolution)
+        name = resolution.name or name
+
+        async with self._lock_tasks(name):
+            try:
+                result = await db.delete_task(self.user_id, name)
+
+                if isinstance(result, TaskNotFoundError):
+                    return ActionResult(
+                        "not_found",
+                        name,
+                        f"Failed to delete a task with the name '{name}'. No matching task was found.",
+                    )
+
+                if isinstance(result, TaskError):
+                    return ActionResult(
+                        "error",
+                        name,
+                        f"Failed to delete a task with the name '{name}'. An unknown error occurred.",
+                    )
+
+                self.task_cache.remove(name)
+
+                return ActionResult("deleted", name, f"Deleted the task: '{name}'.")
+            except Exception as ex:
+                logger.error("Error while deleting task")
+                raise ex
+
+    async def create_tasks(self, tasks: list[TaskSpec]) -> list[ActionResult]:
+        async with self._lock_tasks(*(task.name for task in tasks)):
+            results = await db.create_tasks(self.user_id, tasks)
+
+            actions = []
+            for task, result in zip(tasks, results):
+                if isinstance(result, TaskAlreadyExistsError):
+                    actions.append(
+                        ActionResult(
+                            "exists",
+                            task.name,
+                            f"Failed to create new a task with the name '{task.name.strip().lower()}'. A task with that name already exists.",
+                        )
+                    )
+                    continue
+                if isinstance(result, TaskError):
+                    actions.append(
+                        ActionResult(
+                            "error",
+                            task.name,
+                            f"Failed to create new a task with the name '{task.name.strip().lower()}'. An unknown error occurred.",
+                        )
+                    )
+                    continue
+
+                created = Task(
+                    name=task.name,
+                    is_complete=bool(task.is_complete),
+                    deadline=local_naive(task.deadline) if task.deadline else None,
+                    description=task.description,
+                )
+                self.task_cache.put(created)
+                actions.append(
+                    ActionResult(
+                        "created",
+                        task.name,
+                        f"Created a new task: '{task.name}'.",
+                        task=created,
+                    )
+                )
+
+            return actions
+
+    async def edit_tasks(self, edits: list[TaskEdit]) -> list[ActionResult]:
+        # Unresolvable names are answered without a round trip to the database.
+        actions: dict[int, ActionResult] = {}
+        resolved: list[tuple[int, TaskEdit]] = []
+        for i, edit in enumerate(edits):
+            resolution = self.task_cache.resolve_name(edit.name)
+            if resolution.ambiguous:
+                actions[i] = _ambiguous(resolution)
+            else:
+                resolved.append(
+                    (i, edit.model_copy(update={"name": resolution.name or edit.name}))
+                )
+
+        async with self._lock_tasks(
+            *(edit.name for _, edit in resolved),
+            *(edit.new_name for _, edit in resolved if edit.new_name),
+        ):
+            results = (
+                await db.edit_tasks(
+                    self.user_id,
+                    [(edit.name, edit.updated_fields()) for _, edit in resolved],
+                )
+                if resolved
+                else []
+            )
+
+            for (i, edit), result in zip(resolved, results):
+                if isinstance(result, ValueError):
+                    actions[i] = ActionResult(
+                        "no_fields",
+                        edit.name,
+                        f"The task with the name '{edit.name}' could not be edited. No fields were specified to be updated.",
+                    )
+                    continue
+                if isinstance(result, TaskNotFoundError):
+                    actions[i] = ActionResult(
+                        "not_found",
+                        edit.name,
+                        f"The task with the name '{edit.name}' was not edited. The task could not be found.",
+                    )
+                    continue
+                if isinstance(result, TaskAlreadyExistsError):
+                    actions[i] = ActionResult(
+                        "exists",
+                        edit.name,
+                        f"The task with the name '{edit.name}' could not be edited. A task with the name '{edit.new_name}' already exists.",
+                    )
+                    continue
+                if isinstance(result, Exception):
+                    actions[i] = ActionResult(
+                        "error",
+                        edit.name,
+                        f"The task with the name '{edit.name}' could not be edited. An unknown error occured.",
+                    )
+                    continue
+
+                self.task_cache.replace(edit.name, result)
+                actions[i] = ActionResult(
+                    "edited", edit.name, f"Edited the task: '{edit.name}'.", task=result
+                )
+
+        return [actions[i] for i in sorted(actions)]
+
+    async def delete_tasks(self, names: list[str]) -> list[ActionResult]:
+        # Unresolvable names are answered without a round trip to the database.
+        actions: dict[int, ActionResult] = {}
+        resolved: list[tuple[int, str]] = []
+        for i, name in enumerate(names):
+            resolution = self.task_cache.resolve_name(name)
+            if resolution.ambiguous:
+                actions[i] = _ambiguous(resolution)
+            else:
+                resolved.append((i, resolution.name or name))
+
+        async with self._lock_tasks(*(name for _, name in resolved)):
+            results = (
+                await db.delete_tasks(self.user_id, [name for _, name in resolved])
+                if resolved
+                else []
+            )
+
+            for (i, name), result in zip(resolved, results):
+                if isinstance(result, TaskNotFoundError):
+                    actions[i] = ActionResult(
+                        "not_found",
+                        name,
+                        f"Failed to delete a task with the name '{name}'. No matching task was found.",
+                    )
+                    continue
+                if isinstance(result, TaskError):
+                    actions[i] = ActionResult(
+                        "error",
+                        name,
+                        f"Failed to delete a task with the name '{name}'. An unknown error occurred.",
+                    )
+                    continue
+
+                self.task_cache.remove(name)
+                actions[i] = ActionResult(
+                    "deleted", name, f"Deleted the task: '{name}'."
+                )
+
+        return [actions[i] for i in sorted(actions)]
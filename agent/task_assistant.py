@@ -1,9 +1,9 @@
 from contextlib import asynccontextmanager
-from datetime import datetime
-import json
 import logging
+import time
+from typing import Optional
 from livekit.agents.llm.llm import ChatChunk
-from livekit.agents.llm.chat_context import FunctionCallOutput
+from livekit.agents.llm.chat_context import ChatMessage, FunctionCallOutput
 from livekit.agents.job import get_job_context
 from livekit.agents.voice import ModelSettings
 from livekit.agents import (
@@ -12,19 +12,36 @@ from livekit.agents import (
     FunctionTool,
 )
 from livekit.agents.llm import RawFunctionTool
-import db
-from utils import DateTimeEncoder
+from buffered_writer import BufferedTextWriter
+from chat_compaction import ChatCompactor
 from custom_types import Tools
+from intents import IntentRouter
+from prompt_builder import InstructionBuilder
+from replies import ToolReplies
+from tracing import span, traced, tracer
 
 logger = logging.getLogger("Agent")
 
 
 class TaskAssistant(Agent):
     def __init__(
-        self, text_writer, init_instructions: str = "", tools: Tools = None, **kwargs
+        self,
+        text_writer: BufferedTextWriter,
+        init_instructions: str = "",
+        tools: Tools = None,
+        task_token_budget: int = 1500,
+        keep_turns: int = 6,
+        history_token_budget: int = 2000,
+        intent_router: Optional[IntentRouter] = None,
+        tool_replies: Optional[ToolReplies] = None,
+        **kwargs,
     ) -> None:
         self.init_instructions = init_instructions
         self.writer = text_writer
+        self.instruction_builder = InstructionBuilder(task_token_budget)
+        self.chat_compactor = ChatCompactor(keep_turns, history_token_budget)
+        self.intent_router = intent_router
+        self.tool_replies = tool_replies
         super().__init__(instructions=init_instructions, tools=tools, **kwargs)
 
     # TODO: Verify this works
@@ -34,28 +51,62 @@ class TaskAssistant(Agent):
         tools: list[FunctionTool | RawFunctionTool],
         model_settings: ModelSettings,
     ):
-        print(f"IN LLM NODE. Previous chat type is ({type(chat_ctx.items[-1])}).")
-        if isinstance(
-            chat_ctx.items[-1], FunctionCallOutput
-        ):  # Function was called previously. Return text to the user.
-            print("STREAMING TEXT")
-            async for chunk in self._stream_with_text_output(
-                chat_ctx, tools, model_settings
-            ):
-                yield chunk
+        after_tool_call = isinstance(chat_ctx.items[-1], FunctionCallOutput)
+        # Templated replies to unambiguous tool outcomes and simple commands skip the LLM.
+        if after_tool_call:
+            reply = (
+                self.tool_replies.reply_for_outputs(chat_ctx.items)
+                if self.tool_replies is not None
+                else None
+            )
         else:
-            print("NOT STREAMING TEXT")
-            await self._update_instructions(base=self.init_instructions)
-            async for chunk in Agent.default.llm_node(
-                self, chat_ctx, tools, model_settings
-            ):
+            reply = await self._fast_path_reply(chat_ctx)
+        if reply is not None:
+            self.writer.write(reply)
+            self.writer.flush_nowait()
+            yield reply
+            return
+
+        chat_ctx = self.chat_compactor.compact(chat_ctx)
+        with span("llm_node", after_tool_call=after_tool_call):
+            start = time.perf_counter()
+            first_chunk = True
+            # If a function was called previously, return text to the user.
+            if after_tool_call:
+                stream = self._stream_with_text_output(chat_ctx, tools, model_settings)
+            else:
+                await self._update_instructions(base=self.init_instructions)
+                stream = Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+
+            async for chunk in stream:
+                if first_chunk and tracer.enabled:
+                    tracer.observe("llm_node.first_chunk", time.perf_counter() - start)
+                first_chunk = False
                 yield chunk
 
+        logger.debug(
+            "llm_node finished (after_tool_call = %s).",
+            after_tool_call,
+            extra={"duration": time.perf_counter() - start},
+        )
+
+    async def _fast_path_reply(self, chat_ctx: llm.ChatContext) -> Optional[str]:
+        """Answer a simple command from the user without the LLM, if possible."""
+        last = chat_ctx.items[-1]
+        if (
+            self.intent_router is None
+            or not isinstance(last, ChatMessage)
+            or last.role != "user"
+            or not last.text_content
+        ):
+            return None
+        with span("intent_fast_path"):
+            return await self.intent_router.handle(last.text_content)
+
     async def _stream_with_text_output(self, chat_ctx, tools, model_settings):
         """Stream LLM output while also writing to text stream"""
         try:
             # async with self.text_stream_writer() as writer:
-            print("Writer info:", self.writer.info)
             async for chunk in Agent.default.llm_node(
                 self, chat_ctx, tools, model_settings
             ):
@@ -65,18 +116,20 @@ class TaskAssistant(Agent):
                         if hasattr(chunk, "delta")
                         else None
                     )
-                    print("Content:", content)
                     if isinstance(content, str):
-                        await self.writer.write(content)
+                        self.writer.write(content)
                 elif isinstance(chunk, str):
-                    await self.writer.write(chunk)
+                    self.writer.write(chunk)
                 else:
                     raise Exception(
                         "Expected default llm_node to yield a ChatChunk or a string"
                     )
                 yield chunk
         except Exception as ex:
-            logger.error(f"Issue streaming text to topic. Error: {ex}.")
+            logger.error("Issue streaming text to topic. Error: %s.", ex)
+        finally:
+            # Send what is buffered, also when the reply was interrupted.
+            self.writer.flush_nowait()
 
     @asynccontextmanager
     async def text_stream_writer(self):
@@ -88,25 +141,14 @@ class TaskAssistant(Agent):
         finally:
             await writer.aclose()
 
+    @traced("update_instructions")
     async def _update_instructions(self, base: str):
-        cur = await self._update_task_context(base)
-        cur = await self._update_datetime_context(cur)
-        await self.update_instructions(cur)
-
-    async def _update_task_context(self, cur: str):
-        """Update agent instructions with current task names."""
-        user_id = self.session.userdata.id
-        tasks = await db.get_tasks(user_id)
-        task_names = ", ".join(task.name for task in tasks)
-        return (
-            cur
-            + f"\n\nFor reference, the current task names are: {task_names}.\n\nAdditionally, here is the data pertaining to the current tasks:\n {'\n'.join([json.dumps(task.model_dump(exclude={'id', 'user_id'}), separators=(',', ':'), cls=DateTimeEncoder) for task in tasks])}.\n"
+        """Update agent instructions with the current tasks and datetime, if they changed."""
+        task_cache = self.session.userdata.task_cache
+        tasks = await task_cache.get_tasks()
+        instructions = self.instruction_builder.render(
+            base, tasks, task_cache.version, touched=task_cache.touched
         )
-
-    async def _update_datetime_context(self, cur: str):
-        """Update agent instructions with current datetime."""
-        now = datetime.now()
-        formatted_datetime = now.astimezone()
-        datetime_instructions = f"\n\nLastly, for reference, the current date and time is: {formatted_datetime}. "
-
-        return cur + datetime_instructions
+        if instructions is None:
+            return
+        await self.update_instructions(instructions)
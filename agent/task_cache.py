@@ -0,0 +1,103 @@
+import logging
+import time
+
+import db
+from db import Task, TaskChange
+from name_index import NameResolution, TaskNameIndex
+
+logger = logging.getLogger("Agent")
+
+
+def task_key(name: str) -> str:
+    """Normalize a task name the same way the database matches it (i.e. LOWER(name))."""
+    return name.lower()
+
+
+class TaskCache:
+    """Per-session, write-through view of a user's tasks.
+
+    The cache is loaded once from the database and then kept current by the tools, which
+    apply every successful write to both the database and the cache. Reads only fall back
+    to the database after the cache has been invalidated. `version` is bumped on every
+    change so that consumers can cheaply tell whether anything has changed, and `touched`
+    records when each task was last written (used to rank tasks in the prompt).
+
+    Changes made elsewhere (e.g. by the webapp) arrive through `db.task_changes`, which
+    calls `apply_change` for each change and `invalidate` after a reconnect.
+    """
+
+    def __init__(self, user_id: str) -> None:
+        self.user_id = user_id
+        self._tasks: dict[str, Task] = {}
+        self.touched: dict[str, float] = {}
+        self.names = TaskNameIndex()
+        self._loaded = False
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self) -> None:
+        """(Re)load every task for the user from the database."""
+        self._tasks = {
+            task_key(task.name): task async for task in db.iter_tasks(self.user_id)
+        }
+        self.touched = {}
+        self.names.rebuild(task.name for task in self._tasks.values())
+        self._loaded = True
+        self.version += 1
+
+    async def get_tasks(self) -> list[Task]:
+        """Return the user's tasks, only querying the database if the cache is not loaded."""
+        if self._loaded:
+            self.hits += 1
+        else:
+            self.misses += 1
+            await self.load()
+        return list(self._tasks.values())
+
+    def put(self, task: Task) -> None:
+        """Insert or replace a task after it was written to the database."""
+        self._tasks[task_key(task.name)] = task
+        self.touched[task_key(task.name)] = time.monotonic()
+        self.names.add(task.name)
+        self.version += 1
+
+    def replace(self, name: str, task: Task) -> None:
+        """Replace the task previously named `name` (the task may have been renamed)."""
+        self._tasks.pop(task_key(name), None)
+        self.touched.pop(task_key(name), None)
+        self.names.remove(name)
+        self._tasks[task_key(task.name)] = task
+        self.touched[task_key(task.name)] = time.monotonic()
+        self.names.add(task.name)
+        self.version += 1
+
+    def remove(self, name: str) -> None:
+        if self._tasks.pop(task_key(name), None) is not None:
+            self.touched.pop(task_key(name), None)
+            self.names.remove(name)
+            self.version += 1
+
+    def apply_change(self, change: TaskChange) -> None:
+        """Apply a change published by the database. Ignored until the cache is loaded."""
+        if not self._loaded:
+            return
+        if change.op == "DELETE":
+            self.remove(change.name)
+        elif change.task is not None:
+            self.replace(change.old_name or change.name, change.task)
+
+    def invalidate(self) -> None:
+        """Drop the cached tasks so that the next read goes to the database."""
+        self._tasks = {}
+        self.touched = {}
+        self.names.rebuild(())
+        self._loaded = False
+        self.version += 1
+
+    def resolve_name(self, name: str) -> NameResolution:
+        """Resolve a (possibly misheard) task name to the name of a cached task."""
+        return self.names.resolve(name)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._tasks)}
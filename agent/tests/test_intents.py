@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from intents import Intent, parse_deadline, parse_intent
+
+NOW = datetime(2026, 10, 16, 10, 0)  # A Friday morning.
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Mark groceries as done.", Intent("complete", "groceries")),
+        ("Okay, mark laundry done please", Intent("complete", "laundry")),
+        ("Add eggs to my list", Intent("create", "Eggs")),
+        ("Create a task called go to the gym", Intent("create", "Go To The Gym")),
+        (
+            "Add a task pay rent due tomorrow",
+            Intent("create", "Pay Rent", datetime(2026, 10, 17, 23, 59)),
+        ),
+    ],
+)
+def test_parses_simple_commands(text, expected):
+    assert parse_intent(text, NOW) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "What tasks do I have?",
+        "Mark groceries and laundry as done",
+        "Make the essay due tomorrow",
+        "Make sure I finish the essay",
+        "Add a description to groceries",
+        "Add a note to groceries",
+        "Add a deadline to laundry",
+        "Add 30 minutes to the laundry task",
+        "Add eggs to my shopping list",
+        "Add a task pay rent due someday",
+    ],
+)
+def test_leaves_other_utterances_to_the_llm(text):
+    assert parse_intent(text, NOW) is None
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("tomorrow", datetime(2026, 10, 17, 23, 59)),
+        ("tonight", datetime(2026, 10, 16, 21, 0)),
+        ("today at 5pm", datetime(2026, 10, 16, 17, 0)),
+        ("monday at 09:30", datetime(2026, 10, 19, 9, 30)),
+        ("friday", datetime(2026, 10, 16, 23, 59)),
+        ("next friday", datetime(2026, 10, 23, 23, 59)),
+        ("friday at 8am", datetime(2026, 10, 23, 8, 0)),
+        ("today at 9am", None),  # In the past.
+        ("tomorrow at 5", None),  # Morning or evening?
+        ("soon", None),
+    ],
+)
+def test_parse_deadline(text, expected):
+    assert parse_deadline(text, NOW) == expected
+
+
+def test_parse_deadline_keeps_the_time_zone():
+    now = NOW.replace(tzinfo=timezone(timedelta(hours=2)))
+    assert parse_deadline("tomorrow", now) == datetime(
+        2026, 10, 17, 23, 59, tzinfo=now.tzinfo
+    )
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import prompt_builder
+from db import Task
+from prompt_builder import TASK_TABLE_HEADER, InstructionBuilder
+
+NOW = datetime(2026, 10, 16, 10, 0)
+TASKS = [
+    Task("Laundry", False, None, None),
+    Task("Groceries", False, datetime(2026, 10, 17, 18, 0), "Eggs | milk"),
+    Task("Essay", True, None, None),
+]
+
+
+def test_render_returns_none_when_unchanged():
+    builder = InstructionBuilder()
+
+    rendered = builder.render("Base.", TASKS, 1, NOW)
+
+    assert rendered is not None
+    assert rendered.startswith("Base.")
+    assert builder.render("Base.", TASKS, 1, NOW) is None
+    # Seconds are truncated, so the instructions are stable within the minute.
+    assert builder.render("Base.", TASKS, 1, NOW.replace(second=30)) is None
+    assert builder.render("Base.", TASKS, 1, NOW.replace(minute=1)) is not None
+
+
+def test_task_section_is_only_rebuilt_when_the_version_changes():
+    builder = InstructionBuilder()
+    builder.render("Base.", TASKS, 1, NOW)
+
+    # The version is what tells the builder the tasks changed.
+    assert builder.render("Base.", TASKS[:1], 1, NOW) is None
+
+    rendered = builder.render("Base.", TASKS[:1], 2, NOW)
+    assert rendered is not None
+    assert "Groceries" not in rendered
+
+
+def test_rows_are_only_encoded_for_changed_tasks(monkeypatch):
+    encoded: list[str] = []
+    encode = prompt_builder._encode_task
+
+    def counting_encode(task: Task) -> str:
+        encoded.append(task.name)
+        return encode(task)
+
+    monkeypatch.setattr(prompt_builder, "_encode_task", counting_encode)
+    builder = InstructionBuilder()
+    builder.render("Base.", TASKS, 1, NOW)
+    assert sorted(encoded) == ["Essay", "Groceries", "Laundry"]
+
+    encoded.clear()
+    builder.render("Base.", [TASKS[0]._replace(is_complete=True), *TASKS[1:]], 2, NOW)
+    assert encoded == ["Laundry"]
+
+
+def test_task_table_ranks_and_escapes():
+    section = InstructionBuilder().task_section(TASKS, 1)
+    table = section.split(":\n", 1)[1].strip().splitlines()
+
+    assert table == [
+        TASK_TABLE_HEADER,
+        "Groceries | no | Sat 2026-10-17 18:00 | Eggs / milk",
+        "Laundry | no | - | -",
+        "Essay | yes | - | -",
+    ]
+
+
+def test_tasks_over_the_budget_are_summarized():
+    tasks = [Task(f"Task {i}", i % 2 == 0, None, "x" * 40) for i in range(100)]
+
+    section = InstructionBuilder(task_token_budget=300).task_section(tasks, 1)
+
+    lines = section.strip().splitlines()
+    rows, summary = lines[2:-1], lines[-1]
+    omitted = int(summary.split(" ", 1)[0])
+
+    assert prompt_builder.estimate_tokens(section) <= 300
+    assert len(rows) + omitted == 100
+    assert all(" | no | " in row for row in rows)  # Incomplete tasks first.
+    assert summary.endswith(f", and {omitted - 20} more.")
+
+
+def test_no_tasks():
+    assert "no tasks" in InstructionBuilder().task_section([], 1)
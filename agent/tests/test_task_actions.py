@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import db
+from custom_types import (
+    TaskAlreadyExistsError,
+    TaskEdit,
+    TaskError,
+    TaskNotFoundError,
+    TaskSpec,
+)
+from db import Task
+from task_actions import TaskActions
+from task_cache import TaskCache
+
+GROCERIES = Task("Groceries", False, datetime(2026, 10, 17, 18, 0), None)
+LAUNDRY = Task("Laundry", False, None, None)
+PAY_RENT = Task("Pay rent", False, None, None)
+PAY_BILLS = Task("Pay bills", False, None, None)
+
+
+@pytest.fixture
+def actions(monkeypatch) -> TaskActions:
+    async def iter_tasks(user_id, *args, **kwargs):
+        for task in (GROCERIES, LAUNDRY, PAY_RENT, PAY_BILLS):
+            yield task
+
+    monkeypatch.setattr(db, "iter_tasks", iter_tasks)
+    cache = TaskCache("user")
+    asyncio.run(cache.load())
+    return TaskActions("user", cache)
+
+
+def cached_names(actions: TaskActions) -> list[str]:
+    return [task.name for task in asyncio.run(actions.task_cache.get_tasks())]
+
+
+def test_create_tasks(actions, monkeypatch):
+    calls = []
+
+    async def create_tasks(user_id, tasks):
+        calls.append((user_id, [task.name for task in tasks]))
+        return ["Success", TaskAlreadyExistsError(), TaskError()]
+
+    monkeypatch.setattr(db, "create_tasks", create_tasks)
+
+    results = asyncio.run(
+        actions.create_tasks(
+            [
+                TaskSpec(name="Dishes", description="After dinner"),
+                TaskSpec(name="Laundry"),
+                TaskSpec(name="Vacuum"),
+            ]
+        )
+    )
+
+    assert calls == [("user", ["Dishes", "Laundry", "Vacuum"])]
+    assert [(r.outcome, r.name) for r in results] == [
+        ("created", "Dishes"),
+        ("exists", "Laundry"),
+        ("error", "Vacuum"),
+    ]
+    assert results[0].task == Task("Dishes", False, None, "After dinner")
+    assert [r.succeeded for r in results] == [True, False, False]
+    assert cached_names(actions) == [
+        "Groceries",
+        "Laundry",
+        "Pay rent",
+        "Pay bills",
+        "Dishes",
+    ]
+
+
+def test_edit_tasks(actions, monkeypatch):
+    calls = []
+    renamed = LAUNDRY._replace(name="Wash clothes")
+
+    async def edit_tasks(user_id, edits):
+        calls.append(edits)
+        return [renamed, TaskNotFoundError(), ValueError(), TaskAlreadyExistsError()]
+
+    monkeypatch.setattr(db, "edit_tasks", edit_tasks)
+
+    results = asyncio.run(
+        actions.edit_tasks(
+            [
+                TaskEdit(name="the laundry", new_name="Wash clothes"),
+                TaskEdit(name="pay", is_complete=True),
+                TaskEdit(name="Dishes", is_complete=True),
+                TaskEdit(name="Groceries"),
+                TaskEdit(name="Pay rent", new_name="Pay bills"),
+            ]
+        )
+    )
+
+    # The ambiguous name is answered without a round trip, and the misheard name is
+    # resolved against the cache.
+    assert calls == [
+        [
+            ("Laundry", {"name": "Wash clothes"}),
+            ("Dishes", {"is_complete": True}),
+            ("Groceries", {}),
+            ("Pay rent", {"name": "Pay bills"}),
+        ]
+    ]
+    assert [(r.outcome, r.name) for r in results] == [
+        ("edited", "Laundry"),
+        ("ambiguous", "pay"),
+        ("not_found", "Dishes"),
+        ("no_fields", "Groceries"),
+        ("exists", "Pay rent"),
+    ]
+    assert results[0].task == renamed
+    assert sorted(results[1].candidates) == ["Pay bills", "Pay rent"]
+    assert cached_names(actions) == [
+        "Groceries",
+        "Pay rent",
+        "Pay bills",
+        "Wash clothes",
+    ]
+
+
+def test_delete_tasks(actions, monkeypatch):
+    calls = []
+
+    async def delete_tasks(user_id, names):
+        calls.append(names)
+        return ["Success", TaskNotFoundError(), TaskError()]
+
+    monkeypatch.setattr(db, "delete_tasks", delete_tasks)
+
+    results = asyncio.run(
+        actions.delete_tasks(["groceries", "pay", "Dishes", "Laundry"])
+    )
+
+    assert calls == [["Groceries", "Dishes", "Laundry"]]
+    assert [(r.outcome, r.name) for r in results] == [
+        ("deleted", "Groceries"),
+        ("ambiguous", "pay"),
+        ("not_found", "Dishes"),
+        ("error", "Laundry"),
+    ]
+    assert cached_names(actions) == ["Laundry", "Pay rent", "Pay bills"]
+
+
+def test_batch_of_unresolvable_names_skips_the_database(actions, monkeypatch):
+    async def fail(*args):
+        raise AssertionError("the database should not be called")
+
+    monkeypatch.setattr(db, "edit_tasks", fail)
+    monkeypatch.setattr(db, "delete_tasks", fail)
+
+    edited = asyncio.run(actions.edit_tasks([TaskEdit(name="pay", is_complete=True)]))
+    deleted = asyncio.run(actions.delete_tasks(["pay"]))
+
+    assert [r.outcome for r in edited + deleted] == ["ambiguous", "ambiguous"]
+    assert len(actions.locks) == 0
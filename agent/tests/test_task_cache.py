@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import db
+from db import Task, TaskChange
+from task_cache import TaskCache
+
+GROCERIES = Task("Groceries", False, datetime(2026, 10, 17, 18, 0), None)
+LAUNDRY = Task("Laundry", False, None, "Darks only")
+
+
+@pytest.fixture
+def loads(monkeypatch) -> list[str]:
+    """Serve GROCERIES and LAUNDRY from db.iter_tasks, recording each load's user."""
+    calls: list[str] = []
+
+    async def iter_tasks(user_id, *args, **kwargs):
+        calls.append(user_id)
+        for task in (GROCERIES, LAUNDRY):
+            yield task
+
+    monkeypatch.setattr(db, "iter_tasks", iter_tasks)
+    return calls
+
+
+def test_get_tasks_loads_once(loads):
+    cache = TaskCache("user")
+
+    assert asyncio.run(cache.get_tasks()) == [GROCERIES, LAUNDRY]
+    assert asyncio.run(cache.get_tasks()) == [GROCERIES, LAUNDRY]
+    assert loads == ["user"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 2}
+
+
+def test_invalidate_reloads(loads):
+    cache = TaskCache("user")
+    asyncio.run(cache.get_tasks())
+    version = cache.version
+
+    cache.invalidate()
+
+    assert cache.version > version
+    assert cache.resolve_name("groceries").name is None
+    asyncio.run(cache.get_tasks())
+    assert loads == ["user", "user"]
+
+
+def test_writes_are_keyed_by_lowercased_name(loads):
+    cache = TaskCache("user")
+    asyncio.run(cache.load())
+
+    cache.put(GROCERIES._replace(name="GROCERIES", is_complete=True))
+    assert asyncio.run(cache.get_tasks()) == [
+        GROCERIES._replace(name="GROCERIES", is_complete=True),
+        LAUNDRY,
+    ]
+
+    cache.remove("laundry")
+    assert [task.name for task in asyncio.run(cache.get_tasks())] == ["GROCERIES"]
+    assert "laundry" not in cache.touched
+
+
+def test_replace_renames(loads):
+    cache = TaskCache("user")
+    asyncio.run(cache.load())
+    version = cache.version
+
+    cache.replace("laundry", LAUNDRY._replace(name="Wash clothes"))
+
+    assert cache.version == version + 1
+    assert [task.name for task in asyncio.run(cache.get_tasks())] == [
+        "Groceries",
+        "Wash clothes",
+    ]
+    assert cache.resolve_name("wash clothes").name == "Wash clothes"
+    assert cache.resolve_name("laundry").name is None
+
+
+def test_remove_missing_task_keeps_version(loads):
+    cache = TaskCache("user")
+    asyncio.run(cache.load())
+    version = cache.version
+
+    cache.remove("Dishes")
+
+    assert cache.version == version
+
+
+def test_apply_change(loads):
+    cache = TaskCache("user")
+    change = TaskChange(op="DELETE", user_id="user", name="Laundry")
+
+    cache.apply_change(change)  # Ignored until the cache is loaded.
+    assert cache.version == 0
+
+    asyncio.run(cache.load())
+    cache.apply_change(change)
+    cache.apply_change(
+        TaskChange(
+            op="UPDATE",
+            user_id="user",
+            name="Shopping",
+            old_name="Groceries",
+            task=GROCERIES._replace(name="Shopping"),
+        )
+    )
+    cache.apply_change(
+        TaskChange(
+            op="INSERT",
+            user_id="user",
+            name="Dishes",
+            task=Task("Dishes", False, None, None),
+        )
+    )
+
+    assert [task.name for task in asyncio.run(cache.get_tasks())] == [
+        "Shopping",
+        "Dishes",
+    ]
+
+
+def test_resolve_name(loads):
+    cache = TaskCache("user")
+    asyncio.run(cache.load())
+    cache.put(Task("Pay rent", False, None, None))
+    cache.put(Task("Pay bills", False, None, None))
+
+    assert cache.resolve_name("groceries").name == "Groceries"
+    assert cache.resolve_name("the groceries").name == "Groceries"
+    assert cache.resolve_name("pay the rent").name == "Pay rent"
+    assert cache.resolve_name("laundy").candidates == ["Laundry"]
+
+    resolution = cache.resolve_name("pay")
+    assert resolution.ambiguous
+    assert sorted(resolution.candidates) == ["Pay bills", "Pay rent"]
+
+    resolution = cache.resolve_name("quantum physics")
+    assert resolution.name is None
+    assert not resolution.ambiguous
@@ -0,0 +1,80 @@
+import asyncio
+
+from utils import KeyedLock
+
+
+def test_same_key_runs_in_start_order():
+    locks = KeyedLock()
+    order: list[str] = []
+
+    async def write(label: str) -> None:
+        async with locks.hold("groceries"):
+            order.append(f"{label} start")
+            await asyncio.sleep(0)
+            order.append(f"{label} end")
+
+    async def main() -> None:
+        await asyncio.gather(write("a"), write("b"), write("c"))
+
+    asyncio.run(main())
+
+    assert order == ["a start", "a end", "b start", "b end", "c start", "c end"]
+    assert len(locks) == 0
+
+
+def test_different_keys_run_concurrently():
+    locks = KeyedLock()
+    both_held = asyncio.Event()
+    held = 0
+
+    async def write(key: str) -> None:
+        nonlocal held
+        async with locks.hold(key):
+            held += 1
+            if held == 2:
+                both_held.set()
+            await asyncio.wait_for(both_held.wait(), 1)
+
+    async def main() -> None:
+        await asyncio.gather(write("groceries"), write("laundry"))
+
+    asyncio.run(main())
+    assert len(locks) == 0
+
+
+def test_overlapping_keys_do_not_deadlock():
+    # Both orders acquire "a" before "b", so neither can hold one lock while waiting for
+    # the other.
+    locks = KeyedLock()
+    done: list[tuple[str, ...]] = []
+
+    async def write(*keys: str) -> None:
+        async with locks.hold(*keys):
+            await asyncio.sleep(0)
+            done.append(keys)
+
+    async def main() -> None:
+        await asyncio.wait_for(
+            asyncio.gather(*(write(*keys) for keys in [("a", "b"), ("b", "a")] * 5)), 1
+        )
+
+    asyncio.run(main())
+
+    assert done == [("a", "b"), ("b", "a")] * 5
+    assert len(locks) == 0
+
+
+def test_locks_are_released_on_error():
+    locks = KeyedLock()
+
+    async def main() -> None:
+        try:
+            async with locks.hold("a", "b"):
+                raise ValueError
+        except ValueError:
+            pass
+        async with locks.hold("a"):
+            pass
+
+    asyncio.run(asyncio.wait_for(main(), 1))
+    assert len(locks) == 0
@@ -0,0 +1,143 @@
+"""Latency spans around the stages of a turn (LLM, instructions, database, tools, metadata,
+text stream).
+
+Tracing is configured with the AGENT_TRACING environment variable, a comma-separated list
+of exporters:
+
+- "prometheus": every span is observed in the `agent_stage_duration_seconds` histogram
+  (labelled by stage), which the worker serves on `:{AGENT_PROMETHEUS_PORT}/metrics`. Spans
+  are recorded in the job processes, which write their metrics to PROMETHEUS_MULTIPROC_DIR
+  (by default, `agent-prometheus-{AGENT_PROMETHEUS_PORT}` in the temporary directory) for
+  the worker to aggregate.
+- "otel": every span is also recorded as an OpenTelemetry span, and observed in an
+  OpenTelemetry histogram of the same name. They are exported by the providers that
+  are configured (e.g. with `livekit.agents.telemetry.set_tracer_provider`).
+- "memory": every span is also kept in `tracer.samples` (durations by stage), for offline
+  measurements such as the session replay benchmark (benchmarks/replay.py).
+
+When AGENT_TRACING is unset, `span` returns a shared no-op context manager and `traced`
+returns the function it decorates unchanged.
+"""
+
+from collections import defaultdict
+import functools
+import os
+import time
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, Awaitable, Callable, Optional, ParamSpec, TypeVar
+
+from dotenv import load_dotenv
+
+load_dotenv(".env", verbose=True)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+METRIC_NAME = "agent_stage_duration_seconds"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_NOOP_SPAN = nullcontext()
+
+
+class _Span(AbstractContextManager):
+    def __init__(self, tracer: "Tracer", stage: str, attributes: dict[str, Any]):
+        self._tracer = tracer
+        self._stage = stage
+        self._attributes = attributes
+        self._otel_span = None
+
+    def __enter__(self) -> "_Span":
+        if self._tracer._otel_tracer is not None:
+            # Not made the current span: spans are opened in async generators, which may
+            # resume in another context.
+            self._otel_span = self._tracer._otel_tracer.start_span(
+                self._stage, attributes=self._attributes
+            )
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._tracer.observe(self._stage, time.perf_counter() - self._start)
+        if self._otel_span is not None:
+            if exc is not None:
+                self._otel_span.record_exception(exc)
+            self._otel_span.end()
+
+
+class Tracer:
+    def __init__(self, exporters: set[str]) -> None:
+        self.enabled = bool(exporters)
+        self._prometheus_histogram = None
+        self._otel_tracer = None
+        self._otel_histogram = None
+        self.samples: Optional[defaultdict[str, list[float]]] = (
+            defaultdict(list) if "memory" in exporters else None
+        )
+
+        if "prometheus" in exporters:
+            from prometheus_client import Histogram
+
+            self._prometheus_histogram = Histogram(
+                METRIC_NAME,
+                "Duration of the stages of an agent turn.",
+                ["stage"],
+                buckets=BUCKETS,
+            )
+        if "otel" in exporters:
+            from opentelemetry import metrics, trace
+
+            self._otel_tracer = trace.get_tracer("task-manager-agent")
+            self._otel_histogram = metrics.get_meter(
+                "task-manager-agent"
+            ).create_histogram(
+                METRIC_NAME,
+                unit="s",
+                description="Duration of the stages of an agent turn.",
+            )
+
+    def span(self, stage: str, **attributes: Any) -> AbstractContextManager:
+        """Time the enclosed block as one occurrence of `stage`."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, attributes)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a duration measured by the caller (e.g. the time to the first token)."""
+        if self._prometheus_histogram is not None:
+            self._prometheus_histogram.labels(stage=stage).observe(seconds)
+        if self._otel_histogram is not None:
+            self._otel_histogram.record(seconds, {"stage": stage})
+        if self.samples is not None:
+            self.samples[stage].append(seconds)
+
+    def traced(
+        self, stage: Optional[str] = None
+    ) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+        """Decorate a coroutine function so that each call is timed as `stage` (by default,
+        the function's name)."""
+
+        def decorator(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+            if not self.enabled:
+                return func
+            name = stage or func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+                with _Span(self, name, {}):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+def _exporters() -> set[str]:
+    value = os.environ.get("AGENT_TRACING", "")
+    return {
+        exporter.strip().lower() for exporter in value.split(",") if exporter.strip()
+    }
+
+
+tracer = Tracer(_exporters())
+span = tracer.span
+traced = tracer.traced
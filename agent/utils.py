@@ -1,5 +1,24 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import date, datetime
 import json
+import os
+from typing import AsyncIterator
+
+
+# How dates are formatted in the JSON sent to the webapp.
+DATETIME_FORMAT = "%A, %B %d, %Y at %I:%M %p"
+
+
+def env_number(name: str, default: float) -> float:
+    """The number in the environment variable `name`, or `default` if it is unset or empty."""
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def local_naive(value: datetime) -> datetime:
+    """`value` in local time without a time zone, as deadlines are stored."""
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -7,5 +26,40 @@ class DateTimeEncoder(json.JSONEncoder):
 
     def default(self, o):
         if isinstance(o, (datetime, date)):
-            return o.strftime("%A, %B %d, %Y at %I:%M %p")
+            return o.strftime(DATETIME_FORMAT)
         return super().default(o)
+
+
+class KeyedLock:
+    """A set of asyncio locks identified by key, created on demand and dropped when unused."""
+
+    def __init__(self) -> None:
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._users: dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, *keys: str) -> AsyncIterator[None]:
+        """Hold the locks of all `keys` (acquired in sorted order, so that callers holding
+        overlapping keys cannot deadlock)."""
+        ordered = sorted(set(keys))
+        for key in ordered:
+            self._users[key] = self._users.get(key, 0) + 1
+            self._locks.setdefault(key, asyncio.Lock())
+
+        acquired: list[str] = []
+        try:
+            for key in ordered:
+                await self._locks[key].acquire()
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._locks[key].release()
+            for key in ordered:
+                self._users[key] -= 1
+                if self._users[key] == 0:
+                    del self._users[key]
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -10,4 +10,23 @@ create unique index tts_userid on tts(user_id);
 
 create unique index stt_user_id on stt(user_id);
 
-create unique index llm_user_id on llm(user_id);
\ No newline at end of file
+create unique index llm_user_id on llm(user_id);
+
+-- Keyset pagination of a user's tasks by deadline (tasks without a deadline last), and the
+-- same for complete or incomplete tasks only. The completion is a parameter of the query, so
+-- it is an index column rather than a partial index's predicate, which a generic plan of the
+-- prepared query could not use.
+CREATE INDEX task_userid_deadline_idx
+ON task(user_id, (COALESCE(deadline, 'infinity'::timestamp)), id);
+
+CREATE INDEX task_userid_complete_deadline_idx
+ON task(user_id, is_complete, (COALESCE(deadline, 'infinity'::timestamp)), id);
+
+-- Name prefix searches (LOWER(name) LIKE 'prefix%').
+CREATE INDEX task_userid_lowername_pattern_idx
+ON task(user_id, LOWER(name) text_pattern_ops);
+
+-- Finding inactive guests to delete (see agent/guest_reaper.py).
+CREATE INDEX user_guest_created_at_idx
+ON "user"(created_at)
+WHERE is_guest;
@@ -0,0 +1,91 @@
+-- An append-only feed of the changes to each user's tasks, for clients to apply incrementally.
+-- Every insert, update and delete on the task table is recorded by a trigger, in the same transaction, with a
+-- per-user sequence number (1, 2, 3, ...). A client that has applied the changes up to seq N asks for the changes
+-- with seq > N (see get_task_changes_since in agent/db.py).
+-- The feed is compacted as it grows: only the last 500 changes of each user are kept. A client behind
+-- compacted_seq has to refetch the tasks instead.
+-- A transaction that sets task_manager.skip_change_log to 'on' (e.g. the guest reaper's, see agent/guest_reaper.py)
+-- is neither recorded nor notified: both triggers are skipped.
+-- NOTE: Run this before create_task_notify_trigger.sql, whose notifications include the seq recorded here. Triggers on
+-- the same event fire in name order, so 'task_change_log' fires before 'task_change_notify'.
+
+CREATE TABLE task_change_seq(
+   user_id UUID PRIMARY KEY,
+   last_seq BIGINT NOT NULL DEFAULT 0,
+   compacted_seq BIGINT NOT NULL DEFAULT 0,
+   constraint fk_task_change_seq
+     FOREIGN KEY(user_id)
+       REFERENCES "user"(id)
+       ON DELETE CASCADE
+);
+
+CREATE TABLE task_change(
+   user_id UUID NOT NULL,
+   seq BIGINT NOT NULL,
+   op VARCHAR(6) NOT NULL,
+   name VARCHAR(64) NOT NULL,
+   old_name VARCHAR(64),
+   task JSON,
+   changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+   PRIMARY KEY(user_id, seq),
+   constraint fk_task_change
+     FOREIGN KEY(user_id)
+       REFERENCES "user"(id)
+       ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION task_manager.record_task_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    change_user_id UUID;
+    change_seq BIGINT;
+BEGIN
+    change_user_id := CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END;
+
+    -- The row lock taken here orders the concurrent changes of a user until they commit.
+    INSERT INTO task_manager.task_change_seq (user_id, last_seq) VALUES (change_user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET last_seq = task_change_seq.last_seq + 1
+    RETURNING last_seq INTO change_seq;
+
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO task_manager.task_change (user_id, seq, op, name)
+        VALUES (change_user_id, change_seq, TG_OP, OLD.name);
+    ELSE
+        INSERT INTO task_manager.task_change (user_id, seq, op, name, old_name, task)
+        VALUES (
+            change_user_id,
+            change_seq,
+            TG_OP,
+            NEW.name,
+            CASE WHEN TG_OP = 'UPDATE' THEN OLD.name END,
+            json_build_object(
+                'name', NEW.name,
+                'is_complete', NEW.is_complete,
+                'deadline', NEW.deadline,
+                'description', NEW.description
+            )
+        );
+    END IF;
+
+    -- Compact every 100 changes, keeping the last 500.
+    IF change_seq % 100 = 0 AND change_seq > 500 THEN
+        DELETE FROM task_manager.task_change
+        WHERE user_id = change_user_id AND seq <= change_seq - 500;
+        UPDATE task_manager.task_change_seq SET compacted_seq = change_seq - 500
+        WHERE user_id = change_user_id;
+    END IF;
+
+    -- Read by the notify trigger (transaction-local).
+    PERFORM set_config('task_manager.task_change_seq', change_seq::text, true);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_change_log ON task;
+
+CREATE TRIGGER task_change_log
+AFTER INSERT OR UPDATE OR DELETE ON task
+FOR EACH ROW
+WHEN (current_setting('task_manager.skip_change_log', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION task_manager.record_task_change();
@@ -0,0 +1,43 @@
+-- Publish every change to the task table on the 'task_changes' channel.
+-- The agent listens on this channel to keep its per-session task caches fresh (see TaskChangeListener in agent/db.py).
+-- NOTE: NOTIFY payloads are limited to 8000 bytes, which a single task row is well within.
+-- Each payload includes the change's seq in the task change feed (see create_task_change_table.sql).
+-- Like the feed, it is skipped in a transaction that sets task_manager.skip_change_log to 'on'.
+
+CREATE OR REPLACE FUNCTION task_manager.notify_task_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('task_changes', json_build_object(
+            'op', TG_OP,
+            'user_id', OLD.user_id,
+            'seq', NULLIF(current_setting('task_manager.task_change_seq', true), '')::bigint,
+            'name', OLD.name
+        )::text);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', TG_OP,
+        'user_id', NEW.user_id,
+        'seq', NULLIF(current_setting('task_manager.task_change_seq', true), '')::bigint,
+        'name', NEW.name,
+        'old_name', CASE WHEN TG_OP = 'UPDATE' THEN OLD.name END,
+        'task', json_build_object(
+            'name', NEW.name,
+            'is_complete', NEW.is_complete,
+            'deadline', NEW.deadline,
+            'description', NEW.description
+        )
+    )::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_change_notify ON task;
+
+CREATE TRIGGER task_change_notify
+AFTER INSERT OR UPDATE OR DELETE ON task
+FOR EACH ROW
+WHEN (current_setting('task_manager.skip_change_log', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION task_manager.notify_task_change();
@@ -27,6 +27,7 @@ const SimpleVoiceAssistant = dynamic(
 
 interface AgentProps {
   initTasks: TaskInfo[];
+  initSeq: number;
   apiKeyValidity: ApiKeyValidity | null;
   selectedModels: SelectedModels | null;
 }
@@ -62,8 +63,7 @@ export const Agent = (props: AgentProps) => {
     };
   }, [room]);
 
-  const initTasks = props.initTasks;
-  const { tasks } = useTasks({ room, initTasks });
+  const { tasks } = useTasks({ room, initTasks: props.initTasks, initSeq: props.initSeq });
 
   return (
     <RoomContext.Provider value={room}>
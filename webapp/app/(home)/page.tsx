@@ -1,6 +1,6 @@
 import { auth } from "@/auth";
 import { getSelectedModelsAndValidatedApiKeys } from "@/db/agent-config";
-import { getTasksByUserId } from "@/db/tasks";
+import { getTaskChangeSeq, getTasksByUserId } from "@/db/tasks";
 import { cookies } from "next/headers";
 import { Agent } from "./_components/agent";
 
@@ -18,6 +18,8 @@ export default async function Page() {
     id = session.id;
   }
 
+  // The seq is read first, so that no change made in between is missed (see useTasks).
+  const initSeq = await getTaskChangeSeq(id);
   const initTasks = await getTasksByUserId(id);
   const result = await getSelectedModelsAndValidatedApiKeys(id);
 
@@ -28,6 +30,7 @@ export default async function Page() {
     <div className="h-full w-full bg-secondary p-6">
       <Agent
         initTasks={initTasks}
+        initSeq={initSeq}
         apiKeyValidity={apiKeyValidity}
         selectedModels={selectedModels}
       />
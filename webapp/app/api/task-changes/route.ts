@@ -0,0 +1,33 @@
+import { auth } from "@/auth";
+import { getTaskChangesSince } from "@/db/tasks";
+import { cookies } from "next/headers";
+import { NextRequest, NextResponse } from "next/server";
+
+export const runtime = "nodejs";
+
+// don't cache the results
+export const revalidate = 0;
+
+/**
+ * The user's task changes after the `since` seq (see TaskChangesSince). Used by the task list
+ * to fill gaps in the changes published by the agent.
+ */
+export async function GET(req: NextRequest) {
+  const session = await auth();
+  const userId = session ? session.id : (await cookies()).get("guest_id")?.value;
+  if (!userId) {
+    return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
+  }
+
+  const since = Number(req.nextUrl.searchParams.get("since"));
+  if (!Number.isInteger(since) || since < 0) {
+    return NextResponse.json({ error: "Invalid 'since' parameter." }, { status: 400 });
+  }
+
+  try {
+    return NextResponse.json(await getTaskChangesSince(userId, since), { status: 200 });
+  } catch {
+    // Logged by getTaskChangesSince.
+    return NextResponse.json({ error: "Failed to fetch task changes." }, { status: 500 });
+  }
+}
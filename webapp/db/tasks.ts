@@ -34,3 +34,88 @@ export async function getTasksByUserId(userId: string) {
     throw error;
   }
 }
+
+/**
+ * The seq of the user's latest task change (0 if none). Read it before the tasks, so that
+ * changes made in between are applied again (which is harmless) rather than missed.
+ */
+export async function getTaskChangeSeq(userId: string) {
+  try {
+    const { rows } = await pool.query<{ last_seq: string }>(
+      `SELECT last_seq FROM task_manager.task_change_seq WHERE user_id = $1;`,
+      [userId]
+    );
+    return rows.length ? Number(rows[0].last_seq) : 0;
+  } catch (error) {
+    logger.database("error", "Failed to fetch the task change seq for user", {
+      userId,
+      metadata: {
+        operation: "getTaskChangeSeq",
+        error: error instanceof Error ? error.message : "Unknown error",
+      },
+    });
+    throw error;
+  }
+}
+
+/**
+ * The user's task changes after `since`, in order, or all of their tasks if some of those
+ * changes were compacted away.
+ */
+export async function getTaskChangesSince(
+  userId: string,
+  since: number
+): Promise<TaskChangesSince> {
+  try {
+    const { rows: seqRows } = await pool.query<{ last_seq: string; compacted_seq: string }>(
+      `SELECT last_seq, compacted_seq FROM task_manager.task_change_seq WHERE user_id = $1;`,
+      [userId]
+    );
+    const seq = seqRows.length ? Number(seqRows[0].last_seq) : 0;
+    const compactedSeq = seqRows.length ? Number(seqRows[0].compacted_seq) : 0;
+
+    if (since < compactedSeq) {
+      return { seq, tasks: await getTasksByUserId(userId) };
+    }
+
+    const { rows } = await pool.query<{
+      seq: string;
+      op: TaskChange<TaskInfo>["op"];
+      name: string;
+      old_name: string | null;
+      task: TaskInfoFromLiveKit | null;
+    }>(
+      `
+      SELECT seq, op, name, old_name, task
+      FROM task_manager.task_change
+      WHERE user_id = $1 AND seq > $2 AND seq <= $3
+      ORDER BY seq;
+    `,
+      [userId, since, seq]
+    );
+
+    const changes = rows.map((row) => ({
+      ...row,
+      seq: Number(row.seq),
+      task: row.task
+        ? build_task_obj({
+            name: row.task.name,
+            is_complete: row.task.is_complete ?? false,
+            deadline: row.task.deadline ? new Date(row.task.deadline) : null,
+            description: row.task.description ?? null,
+          })
+        : null,
+    }));
+    return { seq, changes };
+  } catch (error) {
+    logger.database("error", "Failed to fetch task changes for user", {
+      userId,
+      metadata: {
+        operation: "getTaskChangesSince",
+        since,
+        error: error instanceof Error ? error.message : "Unknown error",
+      },
+    });
+    throw error;
+  }
+}
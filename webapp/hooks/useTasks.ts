@@ -1,50 +1,90 @@
 import { build_task_obj_from_livekit } from "@/lib/task";
 import { Room, RoomEvent } from "livekit-client";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 
 interface useTasksProps {
   room: Room;
   initTasks: TaskInfo[];
+  initSeq: number;
+}
+
+const sameName = (a: string, b: string) => a.trim().toLowerCase() === b.trim().toLowerCase();
+
+// Applying a change twice has no further effect, so changes may overlap the initial tasks.
+function applyChange(tasks: TaskInfo[], change: TaskChange<TaskInfo>): TaskInfo[] {
+  if (change.op === "DELETE") {
+    return tasks.filter((task) => !sameName(task.name, change.name));
+  }
+  if (!change.task) {
+    return tasks;
+  }
+  const newTask = change.task;
+  const index = tasks.findIndex(
+    (task) =>
+      sameName(task.name, change.name) ||
+      (change.old_name !== null && sameName(task.name, change.old_name))
+  );
+  if (index === -1) {
+    return [...tasks, newTask];
+  }
+  return tasks.map((task, i) => (i === index ? newTask : task));
 }
 
 export function useTasks(props: useTasksProps) {
   const [tasks, setTasks] = useState(props.initTasks);
+  // The seq of the last change applied (see TaskChange).
+  const lastSeq = useRef(props.initSeq);
+  // Metadata updates are handled one at a time, since filling a gap is asynchronous.
+  const pending = useRef<Promise<void>>(Promise.resolve());
 
   useEffect(() => {
+    const applyChanges = (changes: TaskChange<TaskInfo>[]) => {
+      const fresh = changes.filter((change) => change.seq === null || change.seq > lastSeq.current);
+      if (!fresh.length) {
+        return;
+      }
+      for (const change of fresh) {
+        if (change.seq !== null) {
+          lastSeq.current = change.seq;
+        }
+      }
+      setTasks((tasks) => fresh.reduce(applyChange, tasks));
+    };
+
+    // Fetch the changes missed between the last one applied and the published ones.
+    const fillGap = async () => {
+      const since = lastSeq.current;
+      const response = await fetch(`/api/task-changes?since=${since}`);
+      if (!response.ok) {
+        throw new Error(`Failed to fetch the task changes since ${since}.`);
+      }
+      const result: TaskChangesSince = await response.json();
+      if (result.tasks) {
+        lastSeq.current = Math.max(lastSeq.current, result.seq);
+        setTasks(result.tasks);
+      } else {
+        applyChanges(result.changes);
+      }
+    };
+
+    const handleChanges = async ({ seq, changes, updated_at }: TaskChangesFromLiveKit) => {
+      console.log(`Updated metadata (seq ${seq}) with timestamp: ${updated_at}`);
+      const published = changes.map((change) => ({
+        ...change,
+        task: change.task ? build_task_obj_from_livekit(change.task) : null,
+      }));
+      const first = published[0]?.seq;
+      if (first !== null && first !== undefined && first > lastSeq.current + 1) {
+        await fillGap();
+      }
+      applyChanges(published);
+    };
+
     const handleUpdatedRoomMetadata = () => {
       const metadata = props.room?.metadata;
       if (metadata) {
-        const { update_type, data, updated_at } = JSON.parse(metadata);
-        console.log(`Updated metadata with timestamp: ${updated_at}`);
-
-        if (update_type === "CREATE") {
-          console.log("Creating a task");
-          console.log(`Data: ${JSON.stringify(data)}`);
-          setTasks((prev) => [...prev, build_task_obj_from_livekit(data)]);
-        } else if (update_type === "EDIT") {
-          const { initial_name, task: new_task } = data;
-
-          console.log("Editing tasks.");
-          console.log(`Current tasks: ${JSON.stringify(tasks)}`);
-          setTasks((tasks) =>
-            tasks.map((task) => {
-              if (task.name.trim().toLowerCase() === initial_name.trim().toLowerCase()) {
-                return build_task_obj_from_livekit(new_task);
-              } else {
-                return task;
-              }
-            })
-          );
-        } else if (update_type === "DELETE") {
-          const { name } = data;
-          console.log(`Deleting a task: ${name}`);
-          console.log(`Current tasks: ${JSON.stringify(tasks)}`);
-          setTasks((tasks) =>
-            tasks.filter((task) => task.name.trim().toLowerCase() !== name.trim().toLowerCase())
-          );
-        } else {
-          throw new Error(`Update type (${update_type}) is invalid.`);
-        }
+        const update: TaskChangesFromLiveKit = JSON.parse(metadata);
+        pending.current = pending.current.then(() => handleChanges(update)).catch(console.error);
       }
     };
 
@@ -58,7 +98,7 @@ export function useTasks(props: useTasksProps) {
       props.room.off(RoomEvent.MediaDevicesError, onDeviceFailure);
       props.room.unregisterTextStreamHandler("task-assistant--text");
     };
-  }, [props.room, tasks]);
+  }, [props.room]);
 
   return {
     tasks,
@@ -21,3 +21,26 @@ interface TaskInfoFromDB {
   deadline: Date | null;
   description: string | null;
 }
+
+// A change from the task change feed (see db/task-manager-scripts/create_task_change_table.sql).
+// `seq` is null if the feed is not installed.
+interface TaskChange<T> {
+  seq: number | null;
+  op: "INSERT" | "UPDATE" | "DELETE";
+  name: string;
+  old_name: string | null;
+  task: T | null;
+}
+
+// The room metadata published by the agent. `seq` is that of the last change.
+interface TaskChangesFromLiveKit {
+  seq: number | null;
+  changes: TaskChange<TaskInfoFromLiveKit>[];
+  updated_at: number;
+}
+
+// The response of /api/task-changes. `tasks` replaces `changes` when the requested changes
+// were compacted away.
+type TaskChangesSince =
+  | { seq: number; changes: TaskChange<TaskInfo>[]; tasks?: undefined }
+  | { seq: number; tasks: TaskInfo[]; changes?: undefined };